@@ -1,9 +1,25 @@
+import importlib
+
 __all__ = [
     "azconverter",
     "azkeyvault",
     "azsecrets",
     "azstorage",
     "azenv",
+    "azclients",
+    "azcompress",
+    "azpartition",
 ]
+# need an extra, e.g. `pip install azurify[aio]`, so `from azurify import *` skips them
+_OPTIONAL_MODULES = ["azaio"]
+
+
+def __getattr__(name):
+    # submodules are imported on first access, `import azurify` stays cheap
+    if name in __all__ or name in _OPTIONAL_MODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-from azurify import *
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_OPTIONAL_MODULES))
@@ -0,0 +1,332 @@
+import asyncio
+import io
+import mmap
+import logging
+
+from typing import Iterable, Iterator, Optional
+from functools import partial
+from contextlib import ExitStack
+
+import aiohttp
+
+from azure.core.exceptions import ResourceExistsError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.identity.aio import DefaultAzureCredential
+from azure.keyvault.secrets.aio import SecretClient
+from azure.mgmt.keyvault.aio import KeyVaultManagementClient
+from azure.storage.blob import BlobBlock, ContentSettings
+from azure.storage.blob.aio import ContainerClient
+
+from azurify.azenv import AzEnv
+from azurify.azkeyvault import keyvault_parameters
+from azurify.azsecrets import DEFAULT_MAX_CONCURRENCY
+from azurify.azstorage import (
+    BUFFER_TYPES,
+    DEFAULT_BLOCK_SIZE,
+    ObjectToStore,
+    block_id,
+    data_view,
+    file_blocks,
+    is_local_file,
+    known_containers,
+    open_file,
+    rebuffer,
+    split_blocks,
+)
+
+
+def transport(session: Optional[aiohttp.ClientSession] = None) -> AioHttpTransport:
+    """Transport for the async Azure clients. All clients created with the same
+    session share its connection pool
+
+    Args:
+        session (aiohttp.ClientSession, optional): shared session, the transport
+            creates and owns its own one if None
+
+    Returns:
+        AioHttpTransport: transport for the `transport` argument of the clients
+    """
+    return AioHttpTransport(session=session, session_owner=session is None)
+
+
+class _AsyncResource:
+    """Lifecycle of the async clients and the credential created by a resource"""
+
+    def __init__(self):
+        self._clients = []
+        self._own_credential = None
+
+    def _default_credential(self, credential=None):
+        """Use the given credential or create one which is closed with the resource"""
+        if credential is None:
+            credential = self._own_credential = DefaultAzureCredential()
+        return credential
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the clients and the credential if it was created here"""
+        for client in self._clients:
+            await client.close()
+        if self._own_credential is not None:
+            await self._own_credential.close()
+
+
+class AsyncAzureSecrets(_AsyncResource):
+    """Async Shopify secrets management on Azure
+
+        async with aiohttp.ClientSession() as session:
+            async with AsyncAzureSecrets(vault_url, session=session) as azsecrets:
+                await azsecrets.load()
+                print(azsecrets.SHOPDOMAIN)
+    """
+
+    def __init__(
+        self,
+        vault_url: str,
+        credential=None,
+        session: Optional[aiohttp.ClientSession] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        """Secrets are only fetched with `load` or `get_secret`
+
+        Args:
+            vault_url (str): keyvault URL
+            credential (optional): async credential, `DefaultAzureCredential` if None
+            session (aiohttp.ClientSession, optional): shared HTTP session
+            max_concurrency (int): number of secrets fetched at the same time
+        """
+        super().__init__()
+        self._secrets = dict()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._secret_client = SecretClient(
+            vault_url=vault_url,
+            credential=self._default_credential(credential),
+            transport=transport(session),
+        )
+        self._clients.append(self._secret_client)
+
+    async def load(self, keys: Optional[Iterable[str]] = None) -> None:
+        """Fetch secrets concurrently and create an instance attribute for each
+
+        Args:
+            keys (Iterable[str], optional): Secret keys, all secrets if None
+        """
+        if keys is None:
+            keys = [secret.name async for secret in self._secret_client.list_properties_of_secrets()]
+        await asyncio.gather(*(self._fetch(str(key)) for key in keys))
+
+    async def _fetch(self, key: str) -> str:
+        async with self._semaphore:
+            value = (await self._secret_client.get_secret(key)).value
+        self._store(key, value)
+        return value
+
+    def _store(self, key: str, value: str) -> None:
+        # create entry in secrets dict
+        self._secrets[key] = value
+        # create instance attribute
+        setattr(self, key, value)
+
+    @property
+    def secrets(self) -> dict:
+        """Secrets fetched so far
+
+        Returns:
+            dict: secret key and value
+        """
+        return self._secrets
+
+    async def get_secret(self, key: str) -> str:
+        """Getter for secret, fetched from the keyvault only once
+
+        Args:
+            key (str): Secret key
+
+        Returns:
+            str: Secret value
+        """
+        if key in self._secrets:
+            return self._secrets[key]
+        return await self._fetch(key)
+
+    async def set_secret(self, key: str, value: str) -> None:
+        """Create individual secret
+
+        Args:
+            key (str): Secret key
+            value (str): Secret value
+        """
+        async with self._semaphore:
+            await self._secret_client.set_secret(key, value)
+        self._store(key, value)
+
+    async def set_secrets(self, secrets: dict[str, str]) -> None:
+        """Create secrets concurrently
+
+        Args:
+            secrets (dict[str, str]): Secret keys and values
+        """
+        await asyncio.gather(*(self.set_secret(key, value) for key, value in secrets.items()))
+
+
+class AsyncAzureBlobUploader(_AsyncResource):
+    """Async handler for storing data in Azure Blob Storage
+
+        async with aiohttp.ClientSession() as session:
+            uploads = [AsyncAzureBlobUploader(o, conn_str, session=session) for o in objects]
+            await asyncio.gather(*(u.upload() for u in uploads))
+    """
+
+    def __init__(
+        self,
+        object_to_store: ObjectToStore,
+        conn_str: str,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        """Uploader of a single object, the container client is closed with it
+
+        Args:
+            object_to_store (ObjectToStore): contains filename, container/folder and data
+            conn_str (str): Azure storage connection string
+            session (aiohttp.ClientSession, optional): shared HTTP session
+        """
+        super().__init__()
+        # unpack ObjectToStore
+        self.container_name = object_to_store.container_name
+        self.file_name = object_to_store.object_name
+        data = object_to_store.data_to_store
+        # text is uploaded as UTF-8 like `upload_blob` does, a path is a `pathlib.Path`
+        self.data_to_store = data.encode() if isinstance(data, str) else data
+        self.content_settings = ContentSettings(
+            content_type=object_to_store.content_type,
+            content_encoding=object_to_store.content_encoding,
+        )
+        self._container_client = ContainerClient.from_connection_string(
+            conn_str=conn_str, container_name=self.container_name, transport=transport(session)
+        )
+        self._clients.append(self._container_client)
+
+    async def _container(self) -> ContainerClient:
+        """Getter for container. If container doesn't exist, it's created
+
+        Returns:
+            ContainerClient: Azure object for handling blob container operations
+        """
+        if self._container_client in known_containers:
+            return self._container_client
+        try:
+            await self._container_client.create_container()
+            logging.info(f"Created container `{self.container_name}` because it didn't exist.")
+        except ResourceExistsError:
+            pass
+        known_containers.add(self._container_client)
+        return self._container_client
+
+    async def upload(self) -> None:
+        """Upload the data to Azure blob. Local files and memory maps are uploaded
+        in blocks with `upload_blocks`"""
+        if is_local_file(self.data_to_store) or isinstance(self.data_to_store, mmap.mmap):
+            await self.upload_blocks()
+            return
+        container = await self._container()
+        await container.get_blob_client(self.file_name).upload_blob(
+            self.data_to_store, overwrite=True, content_settings=self.content_settings
+        )
+        logging.info(f"Created blob `{self.file_name}` in container `{self.container_name}`")
+
+    async def upload_blocks(
+        self, block_size: int = DEFAULT_BLOCK_SIZE, max_concurrency: int = 4
+    ) -> int:
+        """Upload the data to Azure blob in blocks which are staged concurrently.
+        The data is read like `AzureBlobUploader.upload_blocks` does: buffers and
+        memory maps are sliced, local files read by offset and streams or
+        iterables of byte chunks rebuffered
+
+        Args:
+            block_size (int): size of a block in bytes
+            max_concurrency (int): number of blocks staged at the same time
+
+        Returns:
+            int: number of bytes uploaded
+        """
+        with ExitStack() as stack:
+            return await self._upload_blocks(self._blocks(stack, block_size), max_concurrency)
+
+    def _blocks(self, stack: ExitStack, block_size: int) -> Iterator:
+        """Blocks of the data, files and views are closed with the stack"""
+        data = self.data_to_store
+        if isinstance(data, io.IOBase) and not isinstance(data, io.BytesIO) and not is_local_file(data):
+            # a stream without file descriptor is read block by block
+            return iter(partial(data.read, block_size), b"")
+        if is_local_file(data):
+            return file_blocks(stack.enter_context(open_file(data)), block_size)
+        if isinstance(data, BUFFER_TYPES):
+            return split_blocks(stack.enter_context(data_view(data)), block_size)
+        return rebuffer(data, block_size)
+
+    async def _upload_blocks(self, blocks: Iterator, max_concurrency: int) -> int:
+        blob_client = (await self._container()).get_blob_client(self.file_name)
+        block_ids = []
+        size = 0
+        in_flight = set()
+        for index, block in enumerate(blocks):
+            # wait for a free slot before the next block is read
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            block_ids.append(block_id(index))
+            size += len(block)
+            in_flight.add(asyncio.ensure_future(blob_client.stage_block(block_ids[-1], block)))
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        await blob_client.commit_block_list(
+            [BlobBlock(block_id=key) for key in block_ids], content_settings=self.content_settings
+        )
+        logging.info(
+            f"Created blob `{self.file_name}` with {len(block_ids)} block(s) in container `{self.container_name}`"
+        )
+        return size
+
+
+class AsyncKeyvault(_AsyncResource):
+    """Async creation and deletion of a keyvault"""
+
+    def __init__(
+        self,
+        kv_name: str,
+        credential=None,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        """Keyvault in the default resource group
+
+        Args:
+            kv_name (str): keyvault name
+            credential (optional): async credential, `DefaultAzureCredential` if None
+            session (aiohttp.ClientSession, optional): shared HTTP session
+        """
+        super().__init__()
+        self.kv_name = kv_name
+        self.keyvault_client = KeyVaultManagementClient(
+            credential=self._default_credential(credential),
+            subscription_id=AzEnv.AZURE_SUBSCRIPTION_ID,
+            transport=transport(session),
+        )
+        self._clients.append(self.keyvault_client)
+
+    async def create(self) -> None:
+        poller = await self.keyvault_client.vaults.begin_create_or_update(
+            AzEnv.AZURE_DEFAULT_GROUP_NAME, self.kv_name, keyvault_parameters()
+        )
+        await poller.result()
+
+    async def keyvault(self):
+        return await self.keyvault_client.vaults.get(AzEnv.AZURE_DEFAULT_GROUP_NAME, self.kv_name)
+
+    async def delete(self) -> None:
+        await self.keyvault_client.vaults.delete(AzEnv.AZURE_DEFAULT_GROUP_NAME, self.kv_name)
@@ -0,0 +1,164 @@
+import threading
+
+from typing import TYPE_CHECKING, Callable, Optional, TypeVar
+
+import requests
+
+from azure.core.pipeline.transport import RequestsTransport
+
+from azurify.azenv import AzEnv
+
+# the SDKs are imported when their first client is created
+if TYPE_CHECKING:
+    from azure.identity import DefaultAzureCredential
+    from azure.storage.blob import BlobServiceClient, ContainerClient
+    from azure.mgmt.keyvault import KeyVaultManagementClient
+    from azure.mgmt.resource import ResourceManagementClient
+
+# max. number of pooled connections per host
+DEFAULT_POOL_SIZE = 32
+
+T = TypeVar("T")
+
+_lock = threading.RLock()
+_registry: dict[tuple, object] = dict()
+
+
+def _cached(key: tuple, create: Callable[[], T]) -> T:
+    """Return the registered object for `key`, create and register it if missing.
+    Clients are reused by all threads, so connections and tokens survive between
+    operations
+
+    Args:
+        key (tuple): registry key
+        create (Callable): creates the object
+
+    Returns:
+        object: registered object
+    """
+    with _lock:
+        if key not in _registry:
+            _registry[key] = create()
+        return _registry[key]
+
+
+def clear() -> None:
+    """Forget all registered clients, e.g. after credentials were rotated"""
+    with _lock:
+        _registry.clear()
+
+
+def http_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """Shared HTTP session of all clients with the same pool size
+
+    Args:
+        pool_size (int): max. number of pooled connections per host
+
+    Returns:
+        requests.Session: session with a connection pool of `pool_size`
+    """
+
+    def create():
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    return _cached(("session", pool_size), create)
+
+
+def transport(pool_size: int = DEFAULT_POOL_SIZE) -> RequestsTransport:
+    """Transport for a client which uses the shared HTTP session
+
+    Args:
+        pool_size (int): max. number of pooled connections per host
+
+    Returns:
+        RequestsTransport: transport for the `transport` argument of the clients
+    """
+    return RequestsTransport(session=http_session(pool_size), session_owner=False)
+
+
+def default_credential() -> "DefaultAzureCredential":
+    """Shared credential, tokens are acquired once and cached until they expire
+
+    Returns:
+        DefaultAzureCredential: credential
+    """
+    from azure.identity import DefaultAzureCredential
+
+    return _cached(("credential",), DefaultAzureCredential)
+
+
+def blob_service_client(conn_str: str) -> "BlobServiceClient":
+    """Blob service client of a storage account
+
+    Args:
+        conn_str (str): Azure storage connection string
+
+    Returns:
+        BlobServiceClient: client
+    """
+    from azure.storage.blob import BlobServiceClient
+
+    return _cached(
+        ("blob_service", conn_str),
+        lambda: BlobServiceClient.from_connection_string(conn_str, transport=transport()),
+    )
+
+
+def container_client(conn_str: str, container_name: str) -> "ContainerClient":
+    """Container client sharing the pipeline of its blob service client
+
+    Args:
+        conn_str (str): Azure storage connection string
+        container_name (str): name of the blob container
+
+    Returns:
+        ContainerClient: client
+    """
+    return _cached(
+        ("container", conn_str, container_name),
+        lambda: blob_service_client(conn_str).get_container_client(container_name),
+    )
+
+
+def keyvault_management_client(subscription_id: Optional[str] = None) -> "KeyVaultManagementClient":
+    """Keyvault management client of a subscription
+
+    Args:
+        subscription_id (str, optional): subscription, `AZURE_SUBSCRIPTION_ID` if None
+
+    Returns:
+        KeyVaultManagementClient: client
+    """
+    from azure.mgmt.keyvault import KeyVaultManagementClient
+
+    subscription_id = subscription_id or AzEnv.AZURE_SUBSCRIPTION_ID
+    return _cached(
+        ("keyvault_management", subscription_id),
+        lambda: KeyVaultManagementClient(
+            credential=default_credential(), subscription_id=subscription_id, transport=transport()
+        ),
+    )
+
+
+def resource_management_client(subscription_id: Optional[str] = None) -> "ResourceManagementClient":
+    """Resource management client of a subscription
+
+    Args:
+        subscription_id (str, optional): subscription, `AZURE_SUBSCRIPTION_ID` if None
+
+    Returns:
+        ResourceManagementClient: client
+    """
+    from azure.mgmt.resource import ResourceManagementClient
+
+    subscription_id = subscription_id or AzEnv.AZURE_SUBSCRIPTION_ID
+    return _cached(
+        ("resource_management", subscription_id),
+        lambda: ResourceManagementClient(
+            credential=default_credential(), subscription_id=subscription_id, transport=transport()
+        ),
+    )
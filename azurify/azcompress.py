@@ -0,0 +1,164 @@
+import os
+import gzip
+
+from typing import Iterable, Iterator, Optional, Protocol
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# uncompressed bytes per independently compressed frame
+DEFAULT_FRAME_SIZE = 4 * 1024 * 1024
+
+
+class Codec(Protocol):
+    """Compression of independent frames. Concatenated frames form a valid stream,
+    so frames can be compressed in parallel"""
+
+    name: str
+    suffix: str
+    content_encoding: Optional[str]
+
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+
+class GzipCodec(Codec):
+    """gzip, every frame is a gzip member"""
+
+    name = "gzip"
+    suffix = "gz"
+    content_encoding = "gzip"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data):
+        # mtime=0 keeps the output reproducible
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+
+class ZstdCodec(Codec):
+    """Zstandard, requires `pip install zstandard`"""
+
+    name = "zstd"
+    suffix = "zst"
+    content_encoding = "zstd"
+
+    def __init__(self, level: int = 3):
+        try:
+            import zstandard
+        except ImportError as error:
+            raise ImportError("zstd compression requires `pip install zstandard`") from error
+        self.level = level
+        self._zstandard = zstandard
+
+    def compress(self, data):
+        # compressors aren't thread-safe, each frame gets its own one
+        return self._zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        reader = self._zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True)
+        return reader.read()
+
+
+class Lz4Codec(Codec):
+    """LZ4 frames, requires `pip install lz4`. There's no HTTP content coding for
+    LZ4, so the blob keeps no `Content-Encoding`"""
+
+    name = "lz4"
+    suffix = "lz4"
+    content_encoding = None
+
+    def __init__(self, level: int = 0):
+        try:
+            import lz4.frame
+        except ImportError as error:
+            raise ImportError("lz4 compression requires `pip install lz4`") from error
+        self.level = level
+        self._frame = lz4.frame
+
+    def compress(self, data):
+        return self._frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data):
+        # lz4.frame.decompress stops after the first frame
+        decompressed = []
+        while data:
+            decompressor = self._frame.LZ4FrameDecompressor()
+            decompressed.append(decompressor.decompress(data))
+            data = decompressor.unused_data
+        return b"".join(decompressed)
+
+
+CODECS = {
+    "gzip": GzipCodec,
+    "zstd": ZstdCodec,
+    "lz4": Lz4Codec,
+}
+
+
+def codec(name: str, **options) -> Codec:
+    """Create a codec by name
+
+    Args:
+        name (str): `gzip`, `zstd` or `lz4`
+        options: codec options, e.g. `level`
+
+    Returns:
+        Codec: codec
+    """
+    return CODECS[name](**options)
+
+
+def compress_iter(
+    chunks: Iterable[bytes], codec: Codec, max_workers: Optional[int] = None
+) -> Iterator[bytes]:
+    """Compress chunks in parallel, every chunk becomes an independent frame. The
+    compressors release the GIL, so threads use multiple cores. Frames are yielded
+    in order and at most `2 * max_workers` chunks are held in memory
+
+    Args:
+        chunks (Iterable[bytes]): data, e.g. converted chunks joined to frame size
+        codec (Codec): codec
+        max_workers (int, optional): number of frames compressed at the same time,
+            number of CPUs if None
+
+    Yields:
+        bytes: compressed frame
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(codec.compress, chunk))
+            if len(in_flight) >= 2 * max_workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def compress(
+    data: bytes,
+    codec: Codec,
+    frame_size: int = DEFAULT_FRAME_SIZE,
+    max_workers: Optional[int] = None,
+) -> bytes:
+    """Compress data in parallel frames
+
+    Args:
+        data (bytes): data, e.g. `ConvertedStream.data`
+        codec (Codec): codec
+        frame_size (int): uncompressed bytes per frame
+        max_workers (int, optional): number of frames compressed at the same time
+
+    Returns:
+        bytes: compressed data
+    """
+    view = memoryview(data)
+    frames = (view[offset : offset + frame_size] for offset in range(0, len(view), frame_size))
+    return b"".join(compress_iter(frames, codec, max_workers=max_workers))
@@ -1,47 +1,973 @@
 import io
-import pandas as pd
+import os
+import re
+import csv
+import json
+import math
+import pickle
+import hashlib
+import datetime
+import tempfile
+import logging
+import itertools
+import threading
 
-from typing import Protocol
-from dataclasses import dataclass
+from itertools import islice
+from functools import lru_cache, partial
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import entry_points
+from json.encoder import encode_basestring_ascii
+from typing import Iterable, Iterator, Optional, Protocol, Sequence, Union
+from dataclasses import dataclass, field
 from strenum import StrEnum
 
+# number of records encoded at once by `convert_iter`
+DEFAULT_CHUNK_ROWS = 10_000
+
+
+def _pandas():
+    # pandas takes longer to import than the rest of azurify, so it's imported
+    # by the first conversion which uses it
+    import pandas
+
+    return pandas
+
 
 class Suffix(StrEnum):
     CSV = "csv"
     JSON = "json"
+    NDJSON = "ndjson"
     XLSX = "xlsx"
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+
+CONTENT_TYPES = {
+    Suffix.CSV: "text/csv",
+    Suffix.JSON: "application/json",
+    Suffix.NDJSON: "application/x-ndjson",
+    Suffix.XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    Suffix.PARQUET: "application/vnd.apache.parquet",
+    Suffix.ARROW: "application/vnd.apache.arrow.file",
+}
+
+
+class Engine(StrEnum):
+    """Encoder of the text converters. `python` skips the DataFrame and writes the
+    records directly. For flat records with str, int, float, bool or None values
+    the output is byte-identical to `pandas`, which includes writing the ints of
+    a column with nulls, missing keys or floats as floats like pandas does"""
+
+    PANDAS = "pandas"
+    PYTHON = "python"
 
 
 class Converter(Protocol):
     def convert(self, data: list[dict]) -> bytes:
         ...
 
+    def convert_iter(
+        self, rows: Iterable[dict], chunk_rows: int = DEFAULT_CHUNK_ROWS
+    ) -> Iterator[bytes]:
+        ...
+
+
+def chunked(rows: Iterable[dict], chunk_rows: int) -> Iterator[list[dict]]:
+    """Split an iterable of records into lists of at most `chunk_rows` records
+
+    Args:
+        rows (Iterable[dict]): records, e.g. a generator
+        chunk_rows (int): max. number of records per chunk
+
+    Yields:
+        list[dict]: next chunk of records
+    """
+    if chunk_rows < 1:
+        raise ValueError(f"`chunk_rows` must be positive, got {chunk_rows}")
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_rows)):
+        yield chunk
+
+
+def infer_columns(records: Iterable[dict]) -> list[str]:
+    """Column names in order of appearance, like the columns of `pd.DataFrame`
+
+    Args:
+        records (Iterable[dict]): records
+
+    Returns:
+        list[str]: column names
+    """
+    columns = dict()
+    for record in records:
+        columns.update(dict.fromkeys(record))
+    return list(columns)
+
+
+def _pandas_values(values: list) -> list:
+    """Values of a column as a DataFrame holds them, pandas has no int column
+    with nulls and makes the ints of a column with nulls or floats floats. NaN
+    is missing like None"""
+    types = set(map(type, values))
+    if int in types and len(types) > 1 and types <= {int, float, type(None)}:
+        return [None if value is None or value != value else float(value) for value in values]
+    if float in types:
+        return [None if value != value else value for value in values]
+    return values
+
+
+def _json_float(value: float) -> str:
+    """Format a float like `DataFrame.to_json` with its default precision of 10,
+    NaN and infinity are null"""
+    if value != value or math.isinf(value):
+        return "null"
+    if value == 0:
+        return "0.0"
+    if not 1e-15 <= abs(value) <= 1e16:
+        mantissa, exponent = format(value, ".9e").split("e")
+        return f"{mantissa.rstrip('0').rstrip('.')}e{exponent[0]}{int(exponent[1:]):02d}"
+    # round the 10 decimals half to odd like pandas' encoder
+    absolute = abs(value)
+    whole = int(absolute)
+    scaled = (absolute - whole) * 10**10
+    fraction = int(scaled)
+    diff = scaled - fraction
+    if diff > 0.5 or (diff == 0.5 and (fraction == 0 or fraction & 1)):
+        fraction += 1
+        if fraction >= 10**10:
+            fraction, whole = 0, whole + 1
+    digits = f"{fraction:010d}".rstrip("0") or "0"
+    return f"{'-' if value < 0 else ''}{whole}.{digits}"
+
+
+def _json_str(value: str) -> str:
+    # pandas escapes the solidus but keeps DEL
+    if "\x7f" in value:
+        return '"' + "\x7f".join(_json_str(part)[1:-1] for part in value.split("\x7f")) + '"'
+    return encode_basestring_ascii(value).replace("/", "\\/")
+
+
+_JSON_ENCODERS = {
+    str: _json_str,
+    int: int.__repr__,
+    # prices and the like repeat a lot
+    float: lru_cache(maxsize=2**16)(_json_float),
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "null",
+}
+
+
+def _json_values(values: list) -> list[str]:
+    """Encode the values of a column, all at once if they have the same type"""
+    try:
+        types = set(map(type, values))
+        if len(types) == 1:
+            return list(map(_JSON_ENCODERS[types.pop()], values))
+        return [_JSON_ENCODERS[type(value)](value) for value in values]
+    except KeyError as error:
+        raise TypeError(f"The python engine can't encode {error.args[0]}, use the pandas engine") from None
+
+
+def _json_records(chunk: list[dict], columns: Optional[Sequence[str]]) -> list[str]:
+    """JSON objects of the records without the pandas DataFrame. Values are
+    encoded column by column
+
+    Args:
+        chunk (list[dict]): records
+        columns (Sequence[str], optional): keys of every object, inferred if None
+
+    Returns:
+        list[str]: one JSON object per record
+    """
+    columns = columns if columns is not None else infer_columns(chunk)
+    fields = []
+    for column in columns:
+        prefix = _json_str(str(column)) + ":"
+        values = _json_values(_pandas_values([record.get(column) for record in chunk]))
+        fields.append([prefix + value for value in values])
+    return ["{" + ",".join(record) + "}" for record in zip(*fields)] if fields else ["{}"] * len(chunk)
+
+
+def _check_engine(engine: str, schema=None) -> Engine:
+    try:
+        engine = Engine(engine)
+    except ValueError:
+        raise ValueError(f"Unknown engine `{engine}`, use one of {[e.value for e in Engine]}") from None
+    if engine == Engine.PYTHON and schema is not None:
+        raise ValueError("Normalizing with a schema requires the pandas engine")
+    return engine
+
+
+class DType(StrEnum):
+    """Column types of a normalized DataFrame. All of them can hold nulls"""
+
+    STRING = "string"
+    INT = "Int64"
+    FLOAT = "Float64"
+    BOOL = "boolean"
+    CATEGORY = "category"
+    # timezone aware, UTC
+    DATETIME = "datetime"
+    # lists and objects which aren't flattened, e.g. line items
+    JSON = "json"
+
+
+# share of distinct values up to which strings of a sample become categories
+CATEGORY_RATIO = 0.5
+DEFAULT_MAX_CATEGORIES = 1_000
+DEFAULT_SAMPLE_ROWS = 1_000
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def flatten(record: dict, sep: str = ".", max_level: Optional[int] = None, prefix: str = "", level: int = 0) -> dict:
+    """Flatten nested objects of a record like `pd.json_normalize`, lists are kept
+
+    Args:
+        record (dict): record, e.g. a Shopify order
+        sep (str): separator of the nested keys
+        max_level (int, optional): max. depth to flatten, all levels if None
+
+    Returns:
+        dict: flat record, e.g. `{"totalPriceSet.shopMoney.amount": "10.00"}`
+    """
+    flat = dict()
+    for key, value in record.items():
+        key = f"{prefix}{key}"
+        if isinstance(value, dict) and value and (max_level is None or level < max_level):
+            flat.update(flatten(value, sep, max_level, f"{key}{sep}", level + 1))
+        else:
+            flat[key] = value
+    return flat
+
+
+def _infer_dtype(values: list, max_categories: int) -> DType:
+    """Column type of the non-null sample values of a column"""
+    types = set(map(type, values))
+    if not types:
+        return DType.STRING
+    if types == {bool}:
+        return DType.BOOL
+    if types == {int}:
+        return DType.INT
+    if types <= {int, float}:
+        return DType.FLOAT
+    if types & {list, dict}:
+        return DType.JSON
+    if types == {datetime.datetime}:
+        return DType.DATETIME
+    if types != {str}:
+        return DType.STRING
+    if all(_ISO_DATE.match(value) for value in values):
+        parsed = _pandas().to_datetime(values, utc=True, errors="coerce", format="ISO8601")
+        if parsed.notna().all():
+            return DType.DATETIME
+    distinct = len(set(values))
+    if distinct <= max_categories and distinct <= len(values) * CATEGORY_RATIO:
+        return DType.CATEGORY
+    return DType.STRING
+
+
+@dataclass
+class Schema:
+    """Flat columns and their types. The order of `columns` is the column order
+    of the output
+
+        Schema({"id": "Int64", "createdAt": "datetime", "currencyCode": "category",
+                "totalPriceSet.shopMoney.amount": "Float64", "lineItems": "json"})
+    """
+
+    columns: dict[str, str] = field(default_factory=dict)
+    sep: str = "."
+    max_level: Optional[int] = None
+
+    def __post_init__(self):
+        self.columns = {name: DType(dtype) for name, dtype in self.columns.items()}
+
+    @classmethod
+    def infer(
+        cls,
+        records: Iterable[dict],
+        sample_rows: int = DEFAULT_SAMPLE_ROWS,
+        max_categories: int = DEFAULT_MAX_CATEGORIES,
+        sep: str = ".",
+        max_level: Optional[int] = None,
+    ) -> "Schema":
+        """Infer the schema from the first records. Strings with ISO dates become
+        datetimes, strings with few distinct values categories
+
+        Args:
+            records (Iterable[dict]): records, only the first `sample_rows` are read
+            sample_rows (int): number of records inspected
+            max_categories (int): max. distinct values of a category
+            sep (str): separator of the nested keys
+            max_level (int, optional): max. depth to flatten, all levels if None
+
+        Returns:
+            Schema: inferred schema
+        """
+        values = dict()
+        for record in islice(records, sample_rows):
+            for key, value in flatten(record, sep, max_level).items():
+                column = values.setdefault(key, [])
+                if value is not None:
+                    column.append(value)
+        columns = dict()
+        for name, column in values.items():
+            # an object which is null in some records also shows up as a column
+            if not column and any(other.startswith(f"{name}{sep}") for other in values):
+                continue
+            columns[name] = _infer_dtype(column, max_categories)
+        return cls(columns, sep=sep, max_level=max_level)
+
+
+_compact_json = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _json_or_null(value):
+    if isinstance(value, (list, dict)):
+        return _compact_json(value)
+    return None if value is None else str(value)
+
+
+def _column(records: list[dict], path: list[str]) -> list:
+    """Values of a flat column, None where a record lacks it"""
+    values = [record.get(path[0]) for record in records]
+    for key in path[1:]:
+        values = [value.get(key) if isinstance(value, dict) else None for value in values]
+    return values
+
+
+def _coerce(values: list, dtype: DType, name: str = ""):
+    """Convert the values of a column to `dtype` in one vectorized pass. Int
+    columns with fractions are widened to Float64"""
+    pd = _pandas()
+    column = pd.Series(values, dtype=object)
+    if dtype == DType.DATETIME:
+        return pd.to_datetime(column, utc=True, errors="coerce", format="ISO8601")
+    if dtype in (DType.INT, DType.FLOAT):
+        numbers = pd.to_numeric(column, errors="coerce")
+        if dtype == DType.INT and (numbers.dropna() % 1 != 0).any():
+            # e.g. an inferred schema saw only ints, failing would abort the export
+            logging.warning(f"Column `{name}` of type {dtype} has fractions, it's converted to {DType.FLOAT}")
+            dtype = DType.FLOAT
+        return numbers.astype(dtype.value)
+    if dtype == DType.JSON:
+        return pd.Series(list(map(_json_or_null, values)), dtype="string")
+    return column.astype(dtype.value)
+
+
+def normalize(records: list[dict], schema: Optional[Schema] = None):
+    """Flatten nested records and convert the columns to compact types. Only the
+    columns of the schema are extracted, each one is converted in a single
+    vectorized pass
+
+    Args:
+        records (list[dict]): records, e.g. Shopify orders
+        schema (Schema, optional): columns and types, inferred from the records if None
+
+    Returns:
+        pd.DataFrame: one column per schema column, missing ones are null
+    """
+    schema = schema if schema is not None else Schema.infer(records)
+    columns = {
+        name: _coerce(_column(records, name.split(schema.sep)), dtype, name) for name, dtype in schema.columns.items()
+    }
+    return _pandas().DataFrame(columns, index=_pandas().RangeIndex(len(records)))
+
+
+def normalize_iter(
+    rows: Iterable[dict], schema: Union[Schema, bool, None] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator:
+    """Normalize records chunk by chunk, all chunks get the same columns and types
+
+    Args:
+        rows (Iterable[dict]): records, e.g. a generator
+        schema (Schema | bool, optional): columns and types, inferred from the first
+            chunk if None or True
+        chunk_rows (int): number of records normalized at once
+
+    Yields:
+        pd.DataFrame: normalized chunk
+    """
+    for chunk in chunked(rows, chunk_rows):
+        if not isinstance(schema, Schema):
+            schema = Schema.infer(chunk, sample_rows=len(chunk))
+        yield normalize(chunk, schema)
+
+
+def _iso_datetimes(df):
+    """Datetime columns as ISO 8601 strings in UTC, numpy formats them several
+    times faster than the CSV and JSON writers of pandas"""
+    import numpy
+
+    for name in df.select_dtypes("datetimetz"):
+        column = df[name]
+        # one precision for the whole column, whole seconds unless there are fractions
+        micro = column.dt.microsecond
+        unit = "s" if not micro.any() else "ms" if not (micro % 1000).any() else "us"
+        text = numpy.datetime_as_string(column.dt.tz_convert(None).to_numpy(), unit=unit, timezone="UTC")
+        df[name] = _pandas().Series(text, index=df.index, dtype="string").mask(column.isna())
+    return df
+
+
+def _frames(
+    rows: Iterable[dict], chunk_rows: int, columns: Optional[Sequence[str]], schema, fix_columns: bool = False
+) -> Iterator:
+    """DataFrames of the pandas engine, normalized if there's a schema. With
+    `fix_columns` the first chunk fixes the columns of the others. Normalized
+    datetimes are ISO strings"""
+    if schema is None:
+        for chunk in chunked(rows, chunk_rows):
+            df = _pandas().DataFrame(chunk, columns=columns)
+            if fix_columns:
+                columns = df.columns
+            yield df
+        return
+    if columns is not None:
+        raise ValueError("Pass either `columns` or `schema`, the schema declares the columns")
+    yield from map(_iso_datetimes, normalize_iter(rows, schema, chunk_rows))
+
 
 class CSVConverter(Converter):
     """Convert list[dict] to stream with CSV data"""
 
-    def convert(self, data):
+    def convert(self, data, engine=Engine.PANDAS, columns=None, schema=None):
+        if _check_engine(engine, schema) == Engine.PYTHON or schema is not None:
+            return ConvertedStream(
+                suffix=Suffix.CSV,
+                data=b"".join(
+                    self.convert_iter(data, len(data) or 1, engine=engine, columns=columns, schema=schema)
+                ),
+            )
         writer = io.BytesIO()
-        pd.DataFrame(data).to_csv(writer, header=True, index=False)
+        _pandas().DataFrame(data, columns=columns).to_csv(writer, header=True, index=False)
         return ConvertedStream(suffix=Suffix.CSV, data=writer.getvalue())
 
+    def convert_iter(
+        self, rows, chunk_rows=DEFAULT_CHUNK_ROWS, engine=Engine.PANDAS, columns=None, schema=None, header=True
+    ):
+        """Convert records to CSV chunk by chunk. The header is written once and
+        the columns are fixed by the first chunk
+
+        Args:
+            rows (Iterable[dict]): records
+            chunk_rows (int): number of records encoded at once
+            engine (str): `pandas` or `python`
+            columns (Sequence[str], optional): columns, inferred from the first chunk if None
+            schema (Schema | bool, optional): normalize the records before they're
+                encoded, True infers the schema from the first chunk. Datetimes
+                are written in ISO format in UTC
+            header (bool): write the header, False for rows appended to a CSV
+
+        Yields:
+            bytes: encoded CSV chunk
+        """
+        if _check_engine(engine, schema) == Engine.PYTHON:
+            yield from self._convert_iter_python(rows, chunk_rows, columns, header)
+            return
+        for df in _frames(rows, chunk_rows, columns, schema, fix_columns=True):
+            writer = io.BytesIO()
+            df.to_csv(writer, header=header, index=False)
+            header = False
+            yield writer.getvalue()
+
+    def _convert_iter_python(self, rows, chunk_rows, columns, header=True):
+        # pandas writes with the csv module too, so quoting is the same
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator=os.linesep)
+        for chunk in chunked(rows, chunk_rows):
+            buffer.seek(0)
+            buffer.truncate()
+            if columns is None:
+                columns = infer_columns(chunk)
+            if header:
+                writer.writerow(columns)
+                header = False
+            writer.writerows(zip(*(_pandas_values([record.get(column) for record in chunk]) for column in columns)))
+            yield buffer.getvalue().encode()
+
+
+# rows of a worksheet including the header
+EXCEL_MAX_ROWS = 1_048_576
+# bytes per chunk of a finished workbook
+EXCEL_READ_SIZE = 4 * 1024 * 1024
+_EXCEL_TYPES = {str, int, float, bool, type(None), datetime.datetime, datetime.date}
+
+
+class _XlsxWriterSheets:
+    """Worksheets of xlsxwriter in constant memory mode, every row is flushed to
+    a temporary file once the next row is started"""
+
+    def __init__(self, file):
+        import xlsxwriter
+
+        self._workbook = xlsxwriter.Workbook(
+            file,
+            {"constant_memory": True, "nan_inf_to_errors": True, "remove_timezone": True, "strings_to_urls": False},
+        )
+        self._date_format = self._workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        self._sheet = None
+        self._writers = dict()
+        self._row = 0
+
+    def add_sheet(self, name: str) -> None:
+        self._sheet = sheet = self._workbook.add_worksheet(name)
+        # typed writers skip the type checks of `write`
+        self._writers = {
+            str: sheet.write_string,
+            int: sheet.write_number,
+            float: sheet.write_number,
+            bool: sheet.write_boolean,
+            datetime.datetime: partial(self._write_datetime, sheet),
+            datetime.date: partial(self._write_datetime, sheet),
+        }
+        self._row = 0
+
+    def _write_datetime(self, sheet, row, column, value):
+        sheet.write_datetime(row, column, value, self._date_format)
+
+    def append(self, values: list) -> None:
+        row, writers = self._row, self._writers
+        for column, value in enumerate(values):
+            if value is not None:
+                writers.get(type(value), self._sheet.write)(row, column, value)
+        self._row += 1
+
+    def close(self) -> None:
+        self._workbook.close()
+
+
+class _OpenpyxlSheets:
+    """Worksheets of openpyxl in write-only mode"""
+
+    def __init__(self, file):
+        import openpyxl
+
+        self._file = file
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheet = None
+
+    def add_sheet(self, name: str) -> None:
+        self._sheet = self._workbook.create_sheet(name)
+
+    def append(self, values: list) -> None:
+        self._sheet.append(values)
+
+    def close(self) -> None:
+        self._workbook.save(self._file)
+
+
+_EXCEL_ENGINES = {"xlsxwriter": _XlsxWriterSheets, "openpyxl": _OpenpyxlSheets}
+
+
+def _excel_value(value):
+    # cells hold scalars only, nested objects are written as text
+    return value if type(value) in _EXCEL_TYPES else str(value)
+
 
 class ExcelConverter(Converter):
-    """Convert list[dict] to Excel"""
+    """Convert list[dict] to Excel. Rows are streamed to the worksheets in constant
+    memory, a new worksheet is started when one is full"""
 
-    def convert(self, data):
-        writer = io.BytesIO()
-        pd.DataFrame(data).to_excel(writer, header=True, index=False)
-        return writer.getvalue()
+    def __init__(self, engine: Optional[str] = None, max_rows: int = EXCEL_MAX_ROWS):
+        """Workbook engine and size of the worksheets
+
+        Args:
+            engine (str, optional): `xlsxwriter` or `openpyxl` (write-only mode),
+                xlsxwriter if it's installed if None
+            max_rows (int): rows per worksheet including the header
+
+        Raises:
+            ValueError: unknown engine or `max_rows` out of range
+        """
+        if engine is not None and engine not in _EXCEL_ENGINES:
+            raise ValueError(f"Unknown Excel engine `{engine}`, use one of {list(_EXCEL_ENGINES)}")
+        if not 2 <= max_rows <= EXCEL_MAX_ROWS:
+            raise ValueError(f"`max_rows` must be between 2 and {EXCEL_MAX_ROWS}, got {max_rows}")
+        self.engine = engine
+        self.max_rows = max_rows
+
+    def _sheets(self, file):
+        if self.engine is not None:
+            return _EXCEL_ENGINES[self.engine](file)
+        try:
+            return _XlsxWriterSheets(file)
+        except ImportError:
+            return _OpenpyxlSheets(file)
+
+    def convert(self, data, columns=None, schema=None):
+        return ConvertedStream(
+            suffix=Suffix.XLSX,
+            data=b"".join(self.convert_iter(data, len(data) or 1, columns=columns, schema=schema)),
+        )
+
+    def _rows(self, rows, chunk_rows, columns, schema) -> Iterator[list]:
+        """Header and cell values of the records, the first chunk fixes the columns"""
+        if schema is None:
+            for chunk in chunked(rows, chunk_rows):
+                if columns is None:
+                    columns = infer_columns(chunk)
+                    yield list(columns)
+                yield from ([_excel_value(record.get(column)) for column in columns] for record in chunk)
+            return
+        header = True
+        for df in normalize_iter(rows, schema, chunk_rows):
+            if header:
+                yield list(df.columns)
+                header = False
+            # Excel has no timezones
+            for name in df.select_dtypes("datetimetz"):
+                df[name] = df[name].dt.tz_localize(None)
+            df = df.astype(object).where(df.notna(), None)
+            yield from map(list, df.itertuples(index=False, name=None))
+
+    def convert_iter(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS, columns=None, schema=None):
+        """Write the records to worksheets row by row, each worksheet starts with
+        the header. A workbook is a zip file which is complete only after the last
+        row, so it's assembled in a temporary file and yielded at the end
+
+        Args:
+            rows (Iterable[dict]): records
+            chunk_rows (int): number of records read at once
+            columns (Sequence[str], optional): columns, inferred from the first chunk if None
+            schema (Schema | bool, optional): normalize the records, True infers the
+                schema from the first chunk
+
+        Yields:
+            bytes: workbook chunk
+        """
+        if columns is not None:
+            if schema is not None:
+                raise ValueError("Pass either `columns` or `schema`, the schema declares the columns")
+            columns = list(columns)
+        with tempfile.TemporaryFile() as file:
+            sheets = self._sheets(file)
+            values = self._rows(rows, chunk_rows, columns, schema)
+            header = columns if columns is not None else next(values, None)
+            written, count = None, 0
+            for row in values:
+                if written is None or written == self.max_rows:
+                    count += 1
+                    sheets.add_sheet(f"Sheet{count}")
+                    sheets.append(header)
+                    written = 1
+                sheets.append(row)
+                written += 1
+            if written is None:
+                # no records, a workbook needs a worksheet
+                sheets.add_sheet("Sheet1")
+                if header:
+                    sheets.append(header)
+            sheets.close()
+            file.seek(0)
+            yield from iter(partial(file.read, EXCEL_READ_SIZE), b"")
 
 
 class JSONConverter(Converter):
     """Convert list[dict] to JSON"""
 
-    def convert(self, data):
+    def convert(self, data, engine=Engine.PANDAS, columns=None, schema=None):
+        if _check_engine(engine, schema) == Engine.PYTHON or schema is not None:
+            return ConvertedStream(
+                suffix=Suffix.JSON,
+                data=b"".join(
+                    self.convert_iter(data, len(data) or 1, engine=engine, columns=columns, schema=schema)
+                ),
+            )
         writer = io.BytesIO()
-        pd.DataFrame(data).to_json(writer, orient="records")
-        return writer.getvalue()
+        _pandas().DataFrame(data, columns=columns).to_json(writer, orient="records")
+        return ConvertedStream(suffix=Suffix.JSON, data=writer.getvalue())
+
+    def convert_iter(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS, engine=Engine.PANDAS, columns=None, schema=None):
+        """Convert records to a JSON array chunk by chunk
+
+        Args:
+            rows (Iterable[dict]): records
+            chunk_rows (int): number of records encoded at once
+            engine (str): `pandas` or `python`
+            columns (Sequence[str], optional): keys of every object, inferred per chunk if None
+            schema (Schema | bool, optional): normalize the records before they're
+                encoded, True infers the schema from the first chunk. Datetimes
+                are written in ISO format in UTC
+
+        Yields:
+            bytes: encoded JSON chunk, the first one opens and the last one
+            closes the array
+        """
+        separator = b"["
+        if _check_engine(engine, schema) == Engine.PYTHON:
+            for chunk in chunked(rows, chunk_rows):
+                yield separator + ",".join(_json_records(chunk, columns)).encode()
+                separator = b","
+        else:
+            for df in _frames(rows, chunk_rows, columns, schema):
+                writer = io.BytesIO()
+                df.to_json(writer, orient="records")
+                # strip the enclosing brackets of the chunk's array
+                yield separator + writer.getvalue()[1:-1]
+                separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+
+
+class NDJSONConverter(Converter):
+    """Convert list[dict] to newline delimited JSON (one record per line)"""
+
+    def convert(self, data, engine=Engine.PANDAS, columns=None, schema=None):
+        return ConvertedStream(
+            suffix=Suffix.NDJSON,
+            data=b"".join(self.convert_iter(data, engine=engine, columns=columns, schema=schema)),
+        )
+
+    def convert_iter(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS, engine=Engine.PANDAS, columns=None, schema=None):
+        """Convert records to newline delimited JSON chunk by chunk
+
+        Args:
+            rows (Iterable[dict]): records
+            chunk_rows (int): number of records encoded at once
+            engine (str): `pandas` or `python`
+            columns (Sequence[str], optional): keys of every object, inferred per chunk if None
+            schema (Schema | bool, optional): normalize the records before they're
+                encoded, True infers the schema from the first chunk. Datetimes
+                are written in ISO format in UTC
+
+        Yields:
+            bytes: encoded lines, each terminated by a newline
+        """
+        if _check_engine(engine, schema) == Engine.PYTHON:
+            for chunk in chunked(rows, chunk_rows):
+                yield ("\n".join(_json_records(chunk, columns)) + "\n").encode()
+            return
+        for df in _frames(rows, chunk_rows, columns, schema):
+            writer = io.BytesIO()
+            df.to_json(writer, orient="records", lines=True)
+            data = writer.getvalue()
+            yield data if data.endswith(b"\n") else data + b"\n"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("Parquet and Arrow output require `pip install pyarrow`") from error
+    return pyarrow
+
+
+class _ChunkSink(io.RawIOBase):
+    """Writable file which hands out the bytes written since the last `drain`"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# chunks held back while a column has only nulls so far and its type is unknown,
+# the schema of a Parquet or Arrow file can't change once a batch is written
+NULL_LOOKAHEAD_CHUNKS = 8
+
+
+def _conform(batch, schema):
+    """Cast a batch to the schema, missing columns are null
+
+    Raises:
+        ValueError: a column is new or its values don't fit the column's type
+    """
+    pa = _pyarrow()
+    for name in batch.schema.names:
+        if schema.get_field_index(name) < 0:
+            raise ValueError(
+                f"Column `{name}` first appears after the file's schema was fixed, pass a `schema` "
+                f"or increase `chunk_rows`"
+            )
+    columns = []
+    for column in schema:
+        if batch.schema.get_field_index(column.name) < 0:
+            columns.append(pa.nulls(batch.num_rows, column.type))
+            continue
+        try:
+            columns.append(batch.column(column.name).cast(column.type, safe=True))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as error:
+            raise ValueError(
+                f"Column `{column.name}` has values which don't fit its type `{column.type}` fixed by "
+                f"the first rows, pass a `schema` or increase `chunk_rows`: {error}"
+            ) from error
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def record_batches(rows: Iterable, chunk_rows: int, schema=None) -> Iterator:
+    """Arrow record batches of records, built without pandas unless they're
+    normalized. Record batches in `rows` are passed through. The schema is fixed
+    by the first batch. Columns with only nulls hold back the batches until their
+    type is known, at most `NULL_LOOKAHEAD_CHUNKS` chunks, and the types of the
+    held back batches are widened to fit all of them, e.g. int to float. Later
+    batches are cast safely to the schema
+
+    Raises:
+        ValueError: a later batch has a new column or values which don't fit the
+            schema, e.g. floats in an int column
+
+    Args:
+        rows (Iterable[dict] | Iterable[pyarrow.RecordBatch]): records or batches
+        chunk_rows (int): number of records per batch
+        schema (Schema | bool, optional): normalize the records, True infers the
+            schema from the first chunk. Categories become dictionary columns
+
+    Yields:
+        pyarrow.RecordBatch: next batch
+    """
+    pa = _pyarrow()
+    if schema is not None:
+        arrow_schema = None
+        for df in normalize_iter(rows, schema, chunk_rows):
+            if arrow_schema is None:
+                # categories differ per chunk, wide indices fit them all
+                inferred = pa.Schema.from_pandas(df, preserve_index=False)
+                arrow_schema = pa.schema(
+                    column.with_type(pa.dictionary(pa.int32(), column.type.value_type))
+                    if pa.types.is_dictionary(column.type)
+                    else column
+                    for column in inferred
+                )
+            try:
+                yield pa.RecordBatch.from_pandas(df, schema=arrow_schema, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as error:
+                # e.g. an int column widened to float after the first batch was written
+                raise ValueError(
+                    f"A chunk doesn't fit the file's schema fixed by the first rows, declare the "
+                    f"column types in the `schema`: {error}"
+                ) from error
+        return
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    if isinstance(first, pa.RecordBatch):
+        yield first
+        yield from rows
+        return
+    schema, pending = None, []
+    for chunk in chunked(itertools.chain([first], rows), chunk_rows):
+        batch = pa.RecordBatch.from_pylist(chunk)
+        if pending or schema is None:
+            pending.append(batch)
+            schema = pa.unify_schemas([schema or batch.schema, batch.schema], promote_options="permissive")
+            if len(pending) < NULL_LOOKAHEAD_CHUNKS and any(pa.types.is_null(column.type) for column in schema):
+                continue
+            for batch in pending:
+                yield _conform(batch, schema)
+            pending = []
+        else:
+            yield _conform(batch, schema)
+    for batch in pending:
+        yield _conform(batch, schema)
+
+
+class ParquetConverter(Converter):
+    """Convert list[dict] to Parquet, one row group per chunk"""
+
+    def __init__(self, compression: str = "snappy", use_dictionary: bool = True):
+        """Compression and encoding of the column chunks
+
+        Args:
+            compression (str): `snappy`, `zstd`, `gzip`, `lz4`, `brotli` or `none`
+            use_dictionary (bool): dictionary encode the columns
+        """
+        self.compression = compression
+        self.use_dictionary = use_dictionary
+
+    def convert(self, data, schema=None):
+        return ConvertedStream(
+            suffix=Suffix.PARQUET, data=b"".join(self.convert_iter(data, len(data) or 1, schema=schema))
+        )
+
+    def convert_iter(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS, schema=None):
+        """Write a row group per chunk and hand out the file bytes written so far
+
+        Args:
+            rows (Iterable[dict] | Iterable[pyarrow.RecordBatch]): records or batches
+            chunk_rows (int): number of records per row group
+            schema (Schema | bool, optional): normalize the records, True infers the schema
+
+        Yields:
+            bytes: Parquet file chunk
+        """
+        pa = _pyarrow()
+        sink = _ChunkSink()
+        writer = None
+        for batch in record_batches(rows, chunk_rows, schema):
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(
+                    sink,
+                    batch.schema,
+                    compression=self.compression,
+                    use_dictionary=self.use_dictionary,
+                )
+            writer.write_table(pa.Table.from_batches([batch]), row_group_size=batch.num_rows)
+            yield sink.drain()
+        if writer is None:
+            # no records, write a file without columns
+            writer = pa.parquet.ParquetWriter(sink, pa.schema([]), compression=self.compression)
+        writer.close()
+        yield sink.drain()
+
+
+class ArrowConverter(Converter):
+    """Convert list[dict] to an Arrow IPC file (Feather V2), one batch per chunk"""
+
+    def __init__(self, compression: Optional[str] = "lz4"):
+        """Compression of the record batches, uncompressed if None
+
+        Args:
+            compression (str, optional): `lz4`, `zstd` or None
+        """
+        self.compression = compression
+
+    def convert(self, data, schema=None):
+        return ConvertedStream(
+            suffix=Suffix.ARROW, data=b"".join(self.convert_iter(data, len(data) or 1, schema=schema))
+        )
+
+    def convert_iter(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS, schema=None):
+        """Write a record batch per chunk and hand out the file bytes written so far
+
+        Args:
+            rows (Iterable[dict] | Iterable[pyarrow.RecordBatch]): records or batches
+            chunk_rows (int): number of records per batch
+            schema (Schema | bool, optional): normalize the records, True infers the schema
+
+        Yields:
+            bytes: Arrow file chunk
+        """
+        pa = _pyarrow()
+        sink = _ChunkSink()
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        writer = None
+        for batch in record_batches(rows, chunk_rows, schema):
+            if writer is None:
+                writer = pa.ipc.new_file(sink, batch.schema, options=options)
+            writer.write_batch(batch)
+            yield sink.drain()
+        if writer is None:
+            writer = pa.ipc.new_file(sink, pa.schema([]), options=options)
+        writer.close()
+        yield sink.drain()
 
 
 @dataclass
@@ -50,13 +976,253 @@ class ConvertedStream:
     data: io.BytesIO
 
 
+# entry point group of converter plugins, e.g. in a plugin's pyproject.toml
+# [project.entry-points."azurify.converters"]
+# avro = "azurify_avro:AvroConverter"
+ENTRY_POINT_GROUP = "azurify.converters"
+
+# bounds of a cache of `convert`
+DEFAULT_CACHE_ENTRIES = 128
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+_lock = threading.RLock()
+_converters: dict[str, Converter] = {
+    "csv": CSVConverter(),
+    "json": JSONConverter(),
+    "ndjson": NDJSONConverter(),
+    "xlsx": ExcelConverter(),
+    "parquet": ParquetConverter(),
+    "arrow": ArrowConverter(),
+    "feather": ArrowConverter(),
+}
+_plugins_loaded = False
+
+
+def register(output_type: str, converter: Converter) -> None:
+    """Register a converter for an output type, replacing an existing one
+
+    Args:
+        output_type (str): name of the format, e.g. `avro`
+        converter (Converter): converter instance or class
+    """
+    if isinstance(converter, type):
+        converter = converter()
+    with _lock:
+        _converters[str(output_type)] = converter
+
+
+def _load_plugins() -> None:
+    """Register the converters of the `azurify.converters` entry points once"""
+    global _plugins_loaded
+    with _lock:
+        if _plugins_loaded:
+            return
+        _plugins_loaded = True
+        plugins = entry_points()
+        # python 3.9 returns a dict of groups
+        if hasattr(plugins, "select"):
+            plugins = plugins.select(group=ENTRY_POINT_GROUP)
+        else:
+            plugins = plugins.get(ENTRY_POINT_GROUP, [])
+        for plugin in plugins:
+            try:
+                register(plugin.name, plugin.load())
+            except Exception as error:
+                logging.warning(f"Skipped converter plugin `{plugin.name}`: {error}")
+
+
 def factory(output_type: str) -> Converter:
-    FACTORIES = {
-        "csv": CSVConverter(),
-        "json": JSONConverter(),
-        "xlsx": ExcelConverter(),
-    }
-    return FACTORIES[output_type]
+    """Converter of an output type. Converters are created once and shared
+
+    Args:
+        output_type (str): e.g. `csv`, or the name of a registered plugin
+
+    Returns:
+        Converter: converter
+    """
+    _load_plugins()
+    return _converters[output_type]
+
+
+def fingerprint(data: list[dict]) -> Optional[str]:
+    """Content fingerprint of records
+
+    Args:
+        data (list[dict]): records
+
+    Returns:
+        str: digest, None if the records can't be pickled
+    """
+    try:
+        pickled = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+    return hashlib.blake2b(pickled, digest_size=20).hexdigest()
+
+
+class ConversionCache:
+    """LRU cache of converted streams bounded by number of entries and bytes"""
+
+    def __init__(
+        self, max_entries: int = DEFAULT_CACHE_ENTRIES, max_bytes: int = DEFAULT_CACHE_BYTES
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._lock = threading.Lock()
+        self._streams: OrderedDict[tuple, ConvertedStream] = OrderedDict()
+
+    def __len__(self):
+        return len(self._streams)
+
+    def get(self, key: tuple) -> Optional[ConvertedStream]:
+        with self._lock:
+            converted = self._streams.get(key)
+            if converted is not None:
+                self._streams.move_to_end(key)
+            return converted
+
+    def put(self, key: tuple, converted: ConvertedStream) -> None:
+        size = len(converted.data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._streams:
+                self.nbytes -= len(self._streams.pop(key).data)
+            self._streams[key] = converted
+            self.nbytes += size
+            while len(self._streams) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._streams.popitem(last=False)
+                self.nbytes -= len(evicted.data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._streams.clear()
+            self.nbytes = 0
+
+
+# shared cache for callers of `convert` which opt in
+conversions = ConversionCache()
+
+
+def convert(
+    output_type: str,
+    data: list[dict],
+    cache: Optional[ConversionCache] = None,
+    **options,
+) -> ConvertedStream:
+    """Convert records. With a cache, unchanged records are returned from it instead
+    of being encoded again
+
+    Args:
+        output_type (str): e.g. `csv`
+        data (list[dict]): records
+        cache (ConversionCache, optional): cache, e.g. `conversions`, no caching if None
+        options: options of the converter's `convert`, e.g. `engine`
+
+    Returns:
+        ConvertedStream: converted data, shared with other callers if cached
+    """
+    converter = factory(output_type)
+    digest = fingerprint(data) if cache is not None else None
+    if digest is None:
+        return converter.convert(data, **options)
+    # a converter registered for the output type later doesn't get the streams of the previous one
+    key = (output_type, converter, digest, repr(sorted(options.items())))
+    converted = cache.get(key)
+    if converted is None:
+        converted = converter.convert(data, **options)
+        cache.put(key, converted)
+    return converted
+
+
+# formats whose encoded shards can be concatenated, workbooks and columnar
+# files have a single footer or directory which covers all rows
+PARALLEL_TYPES = (Suffix.CSV, Suffix.JSON, Suffix.NDJSON)
+
+
+def _encode_shard(output_type: str, shard: list[dict], options: dict, header: bool) -> bytes:
+    """Encode a shard in a worker process. JSON shards are returned without the
+    enclosing brackets, CSV shards only with `header`"""
+    if output_type == Suffix.CSV:
+        options = dict(options, header=header)
+    data = b"".join(factory(output_type).convert_iter(shard, len(shard), **options))
+    return data[1:-1] if output_type == Suffix.JSON else data
+
+
+def convert_parallel(
+    output_type: str,
+    rows: Iterable[dict],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    max_workers: Optional[int] = None,
+    **options,
+) -> Iterator[bytes]:
+    """Encode shards of records in worker processes, so CPU bound encoding isn't
+    limited by the GIL. The shards are reassembled in order to the same output as
+    `convert_iter`: CSV has a single header and JSON is a single array. At most
+    `2 * max_workers` shards are held in memory
+
+        for shard in convert_parallel("csv", orders(), max_workers=4):
+            ...
+
+    Args:
+        output_type (str): `csv`, `json` or `ndjson`
+        rows (Iterable[dict]): records, e.g. a generator
+        chunk_rows (int): number of records per shard
+        max_workers (int, optional): number of worker processes, number of CPUs if None
+        options: options of the converter's `convert_iter`, e.g. `engine`. The
+            CSV columns and a schema of True are inferred from the first shard
+
+    Raises:
+        ValueError: the output type can't be split into shards
+
+    Yields:
+        bytes: encoded shard, the first JSON shard opens and the last one closes
+        the array
+    """
+    if output_type not in PARALLEL_TYPES:
+        raise ValueError(
+            f"`{output_type}` can't be encoded in parallel, supported are {', '.join(PARALLEL_TYPES)}"
+        )
+    _check_engine(options.get("engine", Engine.PANDAS), options.get("schema"))
+    shards = chunked(rows, chunk_rows)
+    first = next(shards, None)
+    if first is None:
+        if output_type == Suffix.JSON:
+            yield b"[]"
+        return
+    # the workers must agree on what the sequential converter fixes by the first chunk
+    if options.get("schema") is True:
+        options["schema"] = Schema.infer(first)
+    elif output_type == Suffix.CSV and options.get("schema") is None and options.get("columns") is None:
+        options["columns"] = infer_columns(first)
+
+    encoded = _encode_shards(output_type, first, shards, options, max_workers or os.cpu_count() or 1)
+    if output_type != Suffix.JSON:
+        yield from encoded
+        return
+    # the brackets go into the first and last shard, so every shard can be staged
+    # as a block of its own
+    previous = b"[" + next(encoded)
+    for data in encoded:
+        yield previous
+        previous = b"," + data
+    yield previous + b"]"
+
+
+def _encode_shards(
+    output_type: str, first: list[dict], shards: Iterable[list[dict]], options: dict, max_workers: int
+) -> Iterator[bytes]:
+    # shards are sent pickled, which takes the parent a fraction of the time of
+    # building Arrow batches from the records, the parent is the serial part
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = deque([pool.submit(_encode_shard, output_type, first, options, True)])
+        for shard in shards:
+            in_flight.append(pool.submit(_encode_shard, output_type, shard, options, False))
+            if len(in_flight) >= 2 * max_workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
 
 
 def main() -> None:
@@ -69,6 +1235,10 @@ def main() -> None:
     converted_data = converter.convert(data)
     print(converted_data)
 
+    # convert a generator of records in chunks
+    for chunk in converter.convert_iter(iter(data), chunk_rows=1):
+        print(chunk)
+
 
 if __name__ == "__main__":
     main()
@@ -1,17 +1,30 @@
-from strenum import StrEnum
 from os import environ
 
-class AzEnv(StrEnum):
-    AZURE_SUBSCRIPTION_ID = environ['AZURE_SUBSCRIPTION_ID'] 
-    AZURE_TENANT_ID = environ['AZURE_TENANT_ID'] 
-    AZURE_CLIENT_ID = environ['AZURE_CLIENT_ID'] 
-    AZURE_CLIENT_SECRET = environ['AZURE_CLIENT_SECRET'] 
-    AZURE_DEFAULT_GROUP_NAME = environ['AZURE_DEFAULT_GROUP_NAME'] 
-    AZURE_DEFAULT_LOCATION = environ['AZURE_DEFAULT_LOCATION'] 
-    AZURE_DEFAULT_OBJECT_ID = environ['AZURE_DEFAULT_OBJECT_ID'] 
+
+class _Settings(type):
+    """Settings are read from the environment when they're accessed, so importing
+    a module doesn't require them"""
+
+    def __getattr__(cls, name):
+        if name in cls.__annotations__:
+            return environ[name]
+        raise AttributeError(f"type object {cls.__name__!r} has no attribute {name!r}")
+
+    def __iter__(cls):
+        return iter(cls.__annotations__)
+
+
+class AzEnv(metaclass=_Settings):
+    AZURE_SUBSCRIPTION_ID: str
+    AZURE_TENANT_ID: str
+    AZURE_CLIENT_ID: str
+    AZURE_CLIENT_SECRET: str
+    AZURE_DEFAULT_GROUP_NAME: str
+    AZURE_DEFAULT_LOCATION: str
+    AZURE_DEFAULT_OBJECT_ID: str
 
 def main():
     print(f"Tenant ID = {AzEnv.AZURE_TENANT_ID}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
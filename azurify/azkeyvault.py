@@ -1,20 +1,35 @@
 import os
 import sys
+import time
 import random
 import re
 import string
 import logging
 
-from typing import Protocol
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Protocol, TypeVar
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.keyvault import KeyVaultManagementClient
-from azure.mgmt.resource import ResourceManagementClient
+from azure.core.exceptions import HttpResponseError
 
-from azurify.azsecrets import AzSecretKeys
+from azurify import azclients
+from azurify.azsecrets import AzSecretKeys, AzureSecrets, SecretWriteResult, WriteStatus
 from azurify.azenv import AzEnv
 
+if TYPE_CHECKING:
+    from azure.mgmt.keyvault import KeyVaultManagementClient
+    from azure.mgmt.resource import ResourceManagementClient
+
+# defaults of the fleet provisioning. ARM throttles writes per subscription, so
+# only a few vaults are created at the same time
+DEFAULT_FLEET_CONCURRENCY = 8
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_MAX_POLL_INTERVAL = 30.0
+DEFAULT_PROVISION_TIMEOUT = 600.0
+DEFAULT_THROTTLE_RETRIES = 5
+
+T = TypeVar("T")
+
 
 @dataclass
 class Secrets:
@@ -28,21 +43,17 @@ class Secret:
 
 
 def resource_client(
-    group_name: str = AzEnv.AZURE_DEFAULT_GROUP_NAME, location: str = AzEnv.AZURE_DEFAULT_LOCATION
-) -> ResourceManagementClient:
-    resource_client = ResourceManagementClient(
-        credential = DefaultAzureCredential(),
-        subscription_id = AzEnv.AZURE_SUBSCRIPTION_ID,
-    )
+    group_name: Optional[str] = None, location: Optional[str] = None
+) -> "ResourceManagementClient":
+    group_name = group_name or AzEnv.AZURE_DEFAULT_GROUP_NAME
+    location = location or AzEnv.AZURE_DEFAULT_LOCATION
+    resource_client = azclients.resource_management_client()
     resource_client.resource_groups.create_or_update(group_name, {"location": location})
     return resource_client
 
 
-def keyvault_client() -> KeyVaultManagementClient:
-    return KeyVaultManagementClient(
-        credential = DefaultAzureCredential(),
-        subscription_id = AzEnv.AZURE_SUBSCRIPTION_ID,
-    )
+def keyvault_client() -> "KeyVaultManagementClient":
+    return azclients.keyvault_management_client()
 
 
 def shopify_store_name(shop_url: str) -> str:
@@ -91,6 +102,39 @@ def generate_shopify_keyvault_name(shop_url: str) -> str:
         return f"kv-{kv_name[:kv_name_length]}-{random_str}"
 
 
+def keyvault_parameters() -> dict:
+    """Parameters of a Shopify keyvault with secrets access for the default object id
+
+    Returns:
+        dict: parameters for `vaults.begin_create_or_update`
+    """
+    return {
+        "location": AzEnv.AZURE_DEFAULT_LOCATION,
+        "properties": {
+            "tenant_id": AzEnv.AZURE_TENANT_ID,
+            "sku": {"family": "A", "name": "standard"},
+            "access_policies": [
+                {
+                    "tenant_id": AzEnv.AZURE_TENANT_ID,
+                    "object_id": AzEnv.AZURE_DEFAULT_OBJECT_ID,
+                    "permissions": {
+                        "secrets": [
+                            "get",
+                            "list",
+                            "set",
+                            "delete",
+                            "purge",
+                        ],
+                    },
+                }
+            ],
+            "enabled_for_deployment": True,
+            "enabled_for_disk_encryption": True,
+            "enabled_for_template_deployment": True,
+        },
+    }
+
+
 class Tresor(Protocol):
     def create() -> None:
         ...
@@ -100,39 +144,16 @@ class Tresor(Protocol):
 
 
 class Keyvault:
-    def __init__(self, kv_name, keyvault_client=keyvault_client()):
+    def __init__(self, kv_name, keyvault_client=None):
         self.kv_name = kv_name
-        self.keyvault_client = keyvault_client
+        # the shared client is created on first use, not when the module is imported
+        self.keyvault_client = keyvault_client or azclients.keyvault_management_client()
 
     def create(self) -> None:
         self.keyvault_client.vaults.begin_create_or_update(
             AzEnv.AZURE_DEFAULT_GROUP_NAME,
             self.kv_name,
-            {
-                "location": AzEnv.AZURE_DEFAULT_LOCATION,
-                "properties": {
-                    "tenant_id": AzEnv.AZURE_TENANT_ID,
-                    "sku": {"family": "A", "name": "standard"},
-                    "access_policies": [
-                        {
-                            "tenant_id": AzEnv.AZURE_TENANT_ID,
-                            "object_id": AzEnv.AZURE_DEFAULT_OBJECT_ID,
-                            "permissions": {
-                                "secrets": [
-                                    "get",
-                                    "list",
-                                    "set",
-                                    "delete",
-                                    "purge",
-                                ],
-                            },
-                        }
-                    ],
-                    "enabled_for_deployment": True,
-                    "enabled_for_disk_encryption": True,
-                    "enabled_for_template_deployment": True,
-                },
-            },
+            keyvault_parameters(),
         ).result()
 
     @property
@@ -143,6 +164,164 @@ class Keyvault:
         self.keyvault_client.vaults.delete(AzEnv.AZURE_DEFAULT_GROUP_NAME, self.kv_name)
 
 
+@dataclass
+class ProvisionResult:
+    """Outcome of provisioning the keyvault of a single store"""
+
+    shop_url: str
+    kv_name: Optional[str] = None
+    vault_url: Optional[str] = None
+    secrets: dict[str, SecretWriteResult] = field(default_factory=dict)
+    seconds: float = 0.0
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and all(
+            result.status != WriteStatus.FAILED for result in self.secrets.values()
+        )
+
+
+def retry_after(error: HttpResponseError) -> Optional[float]:
+    """Seconds to wait according to the `Retry-After` header of a throttled request"""
+    try:
+        return float(error.response.headers["Retry-After"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class KeyvaultFleet:
+    """Create the keyvaults of many Shopify stores concurrently and seed their secrets
+
+        fleet = KeyvaultFleet(max_concurrency=8)
+        results = fleet.provision(shop_urls, secrets={url: {"SHOPDOMAIN": url} for url in shop_urls})
+    """
+
+    def __init__(
+        self,
+        keyvault_client: Optional["KeyVaultManagementClient"] = None,
+        group_name: Optional[str] = None,
+        credential=None,
+        max_concurrency: int = DEFAULT_FLEET_CONCURRENCY,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+        timeout: float = DEFAULT_PROVISION_TIMEOUT,
+        throttle_retries: int = DEFAULT_THROTTLE_RETRIES,
+    ):
+        """Fleet of keyvaults in one resource group, polled with exponential backoff
+
+        Args:
+            keyvault_client (KeyVaultManagementClient, optional): the shared client if None
+            group_name (str, optional): resource group, `AZURE_DEFAULT_GROUP_NAME` if None
+            credential (optional): credential for seeding the secrets, the shared one if None
+            max_concurrency (int): number of vaults provisioned at the same time
+            poll_interval (float): seconds until a vault is polled the first time,
+                doubled after every poll
+            max_poll_interval (float): max. seconds between two polls of a vault
+            timeout (float): seconds until provisioning a vault fails
+            throttle_retries (int): number of retries of a throttled (429) request
+        """
+        self.keyvault_client = keyvault_client or azclients.keyvault_management_client()
+        self.group_name = group_name or AzEnv.AZURE_DEFAULT_GROUP_NAME
+        self.credential = credential
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.throttle_retries = throttle_retries
+
+    def _throttled(self, request: Callable[[], T]) -> T:
+        """Send an ARM request, wait and retry while it's throttled
+
+        Args:
+            request (Callable): sends the request
+
+        Returns:
+            object: response of the request
+        """
+        for attempt in range(self.throttle_retries + 1):
+            try:
+                return request()
+            except HttpResponseError as error:
+                if error.status_code != 429 or attempt == self.throttle_retries:
+                    raise
+                delay = retry_after(error) or min(self.poll_interval * 2**attempt, self.max_poll_interval)
+                logging.warning(f"ARM request throttled, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def create(self, kv_name: str):
+        """Start creating a vault and poll it with backoff until it's provisioned
+
+        Args:
+            kv_name (str): keyvault name
+
+        Raises:
+            RuntimeError: if provisioning the vault failed
+            TimeoutError: if the vault isn't provisioned within `timeout`
+
+        Returns:
+            Vault: provisioned vault
+        """
+        # the poller of the SDK isn't used, its interval doesn't back off
+        self._throttled(
+            lambda: self.keyvault_client.vaults.begin_create_or_update(
+                self.group_name, kv_name, keyvault_parameters(), polling=False
+            ).result()
+        )
+        deadline = time.monotonic() + self.timeout
+        interval = self.poll_interval
+        while True:
+            vault = self._throttled(lambda: self.keyvault_client.vaults.get(self.group_name, kv_name))
+            if vault.properties.provisioning_state == "Succeeded":
+                return vault
+            if vault.properties.provisioning_state == "Failed":
+                raise RuntimeError(f"Provisioning keyvault `{kv_name}` failed")
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"Keyvault `{kv_name}` wasn't provisioned within {self.timeout}s")
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def _provision(self, shop_url: str, secrets: Optional[dict[str, str]]) -> ProvisionResult:
+        result = ProvisionResult(shop_url=shop_url)
+        start = time.perf_counter()
+        try:
+            result.kv_name = generate_shopify_keyvault_name(shop_url)
+            vault = self.create(result.kv_name)
+            result.vault_url = vault.properties.vault_uri or f"https://{result.kv_name}.vault.azure.net/"
+            logging.info(f"Created keyvault `{result.vault_url}` for `{shop_url}`")
+            if secrets:
+                azsecrets = AzureSecrets(vault_url=result.vault_url, credential=self.credential, lazy=True)
+                result.secrets = azsecrets.set_secrets(secrets)
+        except Exception as error:
+            logging.warning(f"Provisioning the keyvault of `{shop_url}` failed: {error}")
+            result.error = error
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def provision(
+        self, shop_urls: Iterable[str], secrets: Optional[dict[str, dict[str, str]]] = None
+    ) -> list[ProvisionResult]:
+        """Provision a keyvault per store. Vaults are created and polled in parallel,
+        at most `max_concurrency` at the same time. A failing store doesn't stop the
+        others
+
+        Args:
+            shop_urls (Iterable[str]): e.g. myshop.myshopify.com
+            secrets (dict[str, dict[str, str]], optional): secrets per shop URL
+                written to its vault once it's provisioned
+
+        Returns:
+            list[ProvisionResult]: result per store in the order of `shop_urls`
+        """
+        shop_urls = list(shop_urls)
+        secrets = secrets or dict()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            results = list(pool.map(lambda url: self._provision(url, secrets.get(url)), shop_urls))
+        failed = [result for result in results if not result.ok]
+        logging.info(f"Provisioned {len(results) - len(failed)} of {len(results)} keyvaults")
+        return results
+
+
 def main(shop_url: str) -> None:
     """Create a keyvault out of a Shopify URL
 
@@ -157,9 +336,22 @@ def main(shop_url: str) -> None:
     logging.info(f"Created keyvault `https://{kv.keyvault.name}.vault.azure.net`in `{kv.keyvault.location}`.")
 
 
+def main_fleet(shop_urls: list[str]) -> None:
+    """Create keyvaults for many Shopify URLs concurrently
+
+    Args:
+        shop_urls (list[str]): e.g. myshop.myshopify.com
+    """
+    for result in KeyvaultFleet().provision(shop_urls):
+        status = result.vault_url if result.ok else f"failed: {result.error}"
+        print(f"{result.shop_url}: {status} ({result.seconds:.0f}s)")
+
+
 if __name__ == "__main__":
     args = sys.argv[1:]
     if len(args) == 2 and args[0] in ["-kv", "--kv", "-kvname", "--kvname", "-keyvault-name", "--keyvault-name"]:
         main(args[1])
+    elif len(args) > 2 and args[0] in ["-kv", "--kv", "-kvname", "--kvname", "-keyvault-name", "--keyvault-name"]:
+        main_fleet(args[1:])
     else:
         print("Keyvault not created! Usage: `python create_keyvault.py -kvname test`")
\ No newline at end of file
@@ -0,0 +1,349 @@
+import json
+import uuid
+import queue
+import logging
+import threading
+
+from typing import Iterable, Iterator, Optional, Sequence, Union
+from itertools import chain, islice
+from datetime import datetime, timezone
+from urllib.parse import quote
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from azurify import azclients
+from azurify.azcompress import Codec
+from azurify.azconverter import DEFAULT_CHUNK_ROWS, Schema
+from azurify.azstorage import (
+    DEFAULT_BLOCK_SIZE,
+    AzureBlobUploader,
+    ObjectToStore,
+    converted_object,
+)
+
+# encoded bytes after which a part is closed and the next one started
+DEFAULT_PART_SIZE = 128 * 1024 * 1024
+# parts written at the same time, rows of further partitions close the least
+# recently used part
+DEFAULT_MAX_OPEN_PARTS = 16
+# blocks of a part staged at the same time
+DEFAULT_PART_CONCURRENCY = 2
+MANIFEST_NAME = "_manifest.json"
+# directory of rows without a partition value, the name Hive and Spark use
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def partition_path(columns: Sequence[str], values: tuple) -> str:
+    """Hive style directory of a partition, e.g. `date=2023-06-12/currency=EUR`
+
+    Args:
+        columns (Sequence[str]): partition columns
+        values (tuple): value per column
+
+    Returns:
+        str: directory, values are URL quoted
+    """
+    return "/".join(
+        f"{column}={NULL_PARTITION if value is None else quote(str(value), safe='')}"
+        for column, value in zip(columns, values)
+    )
+
+
+@dataclass
+class PartInfo:
+    """A part file of the dataset"""
+
+    object_name: str
+    partition: dict[str, Optional[str]]
+    rows: int
+    size: int
+
+
+@dataclass
+class PartitionedResult:
+    """Summary of a partitioned export, also written as `_manifest.json`"""
+
+    container_name: str
+    prefix: str
+    suffix: str
+    partition_by: list[str]
+    parts: list[PartInfo] = field(default_factory=list)
+    created: Optional[str] = None
+
+    @property
+    def rows(self) -> int:
+        return sum(part.rows for part in self.parts)
+
+    @property
+    def size(self) -> int:
+        return sum(part.size for part in self.parts)
+
+    def to_json(self) -> bytes:
+        manifest = asdict(self)
+        manifest.update(rows=self.rows, size=self.size)
+        return json.dumps(manifest, indent=2).encode()
+
+
+class _Aborted(Exception):
+    """The rows of a part stopped because the input failed"""
+
+
+class _Part:
+    """Part file which is converted and uploaded in a worker while the router
+    appends rows to it"""
+
+    def __init__(self, object_name: str, partition: dict):
+        self.object_name = object_name
+        self.partition = partition
+        # few chunks in flight keep the memory per part bounded
+        self.chunks = queue.Queue(maxsize=2)
+        self.buffer = []
+        self.rows = 0
+        self.size = 0
+        self.full = False
+        self.drained = False
+        self.committed = False
+        # set by the router before the end of the rows if they're incomplete
+        self.aborted = False
+
+    def records(self) -> Iterator[dict]:
+        for chunk in iter(self.chunks.get, None):
+            yield from chunk
+        self.drained = True
+        if self.aborted:
+            # stops the upload before the blob is committed
+            raise _Aborted(self.object_name)
+
+    def counted(self, data: Iterable[bytes], part_size: int) -> Iterator[bytes]:
+        for data_chunk in data:
+            self.size += len(data_chunk)
+            # read by the router, a few more rows may follow until it sees it
+            self.full = self.size >= part_size
+            yield data_chunk
+
+    def info(self) -> PartInfo:
+        return PartInfo(object_name=self.object_name, partition=self.partition, rows=self.rows, size=self.size)
+
+
+class PartitionedWriter:
+    """Write records as a Hive partitioned dataset of part files, e.g.
+
+        orders/date=2023-06-12/part-00017-9f1c2b4e6a8d4c0e8a5b3d7f1e2c4a6b.parquet
+
+    Rows are routed to an open part per partition, a part is closed once its
+    encoded size reaches `part_size` and the next rows of the partition go to a
+    new one. Parts are converted and uploaded concurrently while rows arrive.
+    `_manifest.json` lists the parts with their partition values, sizes and row
+    counts, it's written after all parts were uploaded. Part names contain a token
+    of the write like Spark's, so a rerun never overwrites only some parts of an
+    earlier one. If a write fails, its committed parts are deleted again
+
+        writer = PartitionedWriter(conn_str, "exports", "orders", "parquet", partition_by=["date"])
+        result = writer.write(orders())
+    """
+
+    def __init__(
+        self,
+        conn_str: str,
+        container_name: str,
+        prefix: str,
+        suffix: str,
+        partition_by: Sequence[str],
+        part_size: int = DEFAULT_PART_SIZE,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        max_open_parts: int = DEFAULT_MAX_OPEN_PARTS,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_concurrency: int = DEFAULT_PART_CONCURRENCY,
+        codec: Optional[Union[str, Codec]] = None,
+        schema: Union[Schema, bool, None] = None,
+        keep_partition_columns: bool = False,
+    ):
+        """Writer of a dataset partitioned in folders under `prefix`
+
+        Args:
+            conn_str (str): Azure storage connection string
+            container_name (str): name of the blob container
+            prefix (str): folder of the dataset, e.g. `orders`
+            suffix (str): output format, e.g. `parquet`
+            partition_by (Sequence[str]): partition columns, outermost first
+            part_size (int): encoded bytes after which a part is closed. Excel
+                workbooks are only encoded when they're closed, so they aren't split
+            chunk_rows (int): number of records encoded at once
+            max_open_parts (int): parts written at the same time
+            block_size (int): size of a block in bytes
+            max_concurrency (int): blocks of a part staged at the same time
+            codec (str | Codec, optional): compress the parts with `gzip`, `zstd` or `lz4`
+            schema (Schema | bool, optional): flatten and type the records before
+                they're converted, True infers the schema from the first chunk of
+                rows, all parts share it
+            keep_partition_columns (bool): keep the partition columns in the part
+                files, by default their values are only in the path like Spark writes
+
+        Raises:
+            ValueError: `max_open_parts` isn't positive
+        """
+        if max_open_parts < 1:
+            raise ValueError(f"`max_open_parts` must be positive, got {max_open_parts}")
+        self.conn_str = conn_str
+        self.container_name = container_name
+        self.prefix = prefix.strip("/")
+        self.suffix = suffix
+        self.partition_by = list(partition_by)
+        self.part_size = part_size
+        self.chunk_rows = chunk_rows
+        self.max_open_parts = max_open_parts
+        self.block_size = block_size
+        self.max_concurrency = max_concurrency
+        self.codec = codec
+        self.schema = schema
+        self.keep_partition_columns = keep_partition_columns
+        self._count = 0
+        self._token = uuid.uuid4().hex
+        self._lock = threading.Lock()
+
+    def _object_name(self, values: tuple) -> str:
+        with self._lock:
+            number = self._count
+            self._count += 1
+        folder = "/".join(filter(None, [self.prefix, partition_path(self.partition_by, values)]))
+        return f"{folder}/part-{number:05d}-{self._token}.{self.suffix}"
+
+    def _upload(self, part: _Part, schema: Union[Schema, bool, None]) -> None:
+        """Convert and upload the rows of a part until the router closes it"""
+        try:
+            object_to_store = converted_object(
+                part.records(),
+                self.suffix,
+                self.container_name,
+                part.object_name,
+                self.chunk_rows,
+                self.codec,
+                schema,
+            )
+            part.object_name = object_to_store.object_name
+            object_to_store.data_to_store = part.counted(object_to_store.data_to_store, self.part_size)
+            AzureBlobUploader(object_to_store=object_to_store, conn_str=self.conn_str).upload_blocks(
+                block_size=self.block_size, max_concurrency=self.max_concurrency
+            )
+            part.committed = True
+            logging.info(f"Created part `{part.object_name}` with {part.rows} rows")
+        except _Aborted:
+            logging.warning(f"Aborted part `{part.object_name}`, its staged blocks aren't committed")
+        finally:
+            # unblock the router if the upload stopped early
+            if not part.drained:
+                for _ in iter(part.chunks.get, None):
+                    pass
+
+    def _discard(self, parts: list[_Part]) -> None:
+        """Delete the committed parts of a failed write, listings of the folder
+        would read them without a manifest"""
+        container = azclients.container_client(self.conn_str, self.container_name)
+        for part in parts:
+            if not part.committed:
+                continue
+            try:
+                container.delete_blob(part.object_name)
+            except ResourceNotFoundError:
+                pass
+            except Exception as error:
+                logging.warning(f"Deleting part `{part.object_name}` of the failed write failed: {error}")
+
+    def _close(self, part: _Part) -> None:
+        if part.buffer:
+            part.chunks.put(part.buffer)
+            part.buffer = []
+        part.chunks.put(None)
+
+    def write(self, rows: Iterable[dict]) -> PartitionedResult:
+        """Route the records to part files, upload them and write the manifest
+
+        Args:
+            rows (Iterable[dict]): records, e.g. a generator. Sorted by the partition
+                columns, every partition is written to as few parts as possible
+
+        Raises:
+            Exception: the first error of a failed part or of `rows`. Open parts
+                aren't committed, committed ones are deleted and no manifest is written
+
+        Returns:
+            PartitionedResult: parts of the dataset
+        """
+        columns = self.partition_by
+        excluded = set() if self.keep_partition_columns else set(columns)
+        schema = self.schema
+        if schema is True:
+            # parts with a schema of their own could disagree on the types
+            rows = iter(rows)
+            head = list(islice(rows, self.chunk_rows))
+            sample = [{k: v for k, v in row.items() if k not in excluded} for row in head]
+            schema = Schema.infer(sample, sample_rows=len(sample))
+            rows = chain(head, rows)
+        open_parts: OrderedDict[tuple, _Part] = OrderedDict()
+        parts, futures = [], []
+        with self._lock:
+            self._token = uuid.uuid4().hex
+            self._count = 0
+        try:
+            # workers of closed parts may still upload, so there are spare ones
+            with ThreadPoolExecutor(max_workers=2 * self.max_open_parts) as pool:
+                try:
+                    for row in rows:
+                        key = tuple(row.get(column) for column in columns)
+                        part = open_parts.get(key)
+                        if part is not None and part.full:
+                            self._close(open_parts.pop(key))
+                            part = None
+                        if part is None:
+                            if len(open_parts) >= self.max_open_parts:
+                                self._close(open_parts.popitem(last=False)[1])
+                            partition = {
+                                column: None if value is None else str(value)
+                                for column, value in zip(columns, key)
+                            }
+                            part = open_parts[key] = _Part(self._object_name(key), partition)
+                            parts.append(part)
+                            futures.append(pool.submit(self._upload, part, schema))
+                        else:
+                            open_parts.move_to_end(key)
+                        part.buffer.append({k: v for k, v in row.items() if k not in excluded} if excluded else row)
+                        part.rows += 1
+                        if len(part.buffer) >= self.chunk_rows:
+                            part.chunks.put(part.buffer)
+                            part.buffer = []
+                except BaseException:
+                    # the open parts are incomplete, a listing of the folder must not find them
+                    for part in open_parts.values():
+                        part.aborted = True
+                    raise
+                finally:
+                    for part in open_parts.values():
+                        self._close(part)
+                # raises the first error after all parts finished
+                for future in futures:
+                    future.result()
+        except BaseException:
+            self._discard(parts)
+            raise
+
+        result = PartitionedResult(
+            container_name=self.container_name,
+            prefix=self.prefix,
+            suffix=self.suffix,
+            partition_by=columns,
+            parts=[part.info() for part in parts],
+            created=datetime.now(timezone.utc).isoformat(),
+        )
+        manifest_name = "/".join(filter(None, [self.prefix, MANIFEST_NAME]))
+        AzureBlobUploader(
+            ObjectToStore(manifest_name, self.container_name, result.to_json(), "application/json"),
+            conn_str=self.conn_str,
+        ).upload()
+        logging.info(
+            f"Created dataset `{self.prefix}` with {len(result.parts)} part(s) and {result.rows} rows "
+            f"in container `{self.container_name}`"
+        )
+        return result
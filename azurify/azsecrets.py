@@ -1,12 +1,30 @@
+import os
 import json
+import hmac
+import hashlib
+import time
 import logging
-
-from typing import Protocol
+import tempfile
+import threading
+
+from types import SimpleNamespace
+from typing import Iterable, Optional, Protocol
+from datetime import datetime
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ThreadPoolExecutor
 from strenum import StrEnum
 from enum import auto
 
-from azure.identity import DefaultAzureCredential
+from azure.core.exceptions import ResourceNotFoundError
 from azure.keyvault.secrets import SecretClient
+from cryptography.fernet import Fernet, InvalidToken
+
+from azurify import azclients
+
+# number of secrets fetched at the same time
+DEFAULT_MAX_CONCURRENCY = 16
+# environment variable holding the Fernet key of the local snapshot
+SNAPSHOT_KEY_ENV = "AZURIFY_SNAPSHOT_KEY"
 
 
 class AzSecretKeys(StrEnum):
@@ -17,6 +35,75 @@ class AzSecretKeys(StrEnum):
     AZSTORAGECONNSTR = auto()
 
 
+@dataclass
+class CachedSecret:
+    """Cached secret value and the version it was fetched with"""
+
+    value: str
+    version: Optional[str] = None
+    updated_on: Optional[datetime] = None
+    fetched_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class CacheStats:
+    """Counters of the secrets cache
+
+    hits: secret served from cache
+    misses: secret fetched because it wasn't cached
+    stale_hits: expired secret served while it's revalidated in the background
+    refreshes: secret downloaded again because its version changed
+    revalidations: cache compared against the keyvault versions
+    """
+
+    hits: int = 0
+    misses: int = 0
+    stale_hits: int = 0
+    refreshes: int = 0
+    revalidations: int = 0
+
+
+def _snapshot_cipher(key: Optional[str] = None) -> Fernet:
+    """Cipher for the local secrets snapshot
+
+    Args:
+        key (str, optional): Fernet key, read from `AZURIFY_SNAPSHOT_KEY` if None
+
+    Raises:
+        ValueError: if no key is given
+
+    Returns:
+        Fernet: cipher
+    """
+    key = key or os.environ.get(SNAPSHOT_KEY_ENV)
+    if not key:
+        raise ValueError(
+            f"Encrypting the secrets snapshot requires a key in `{SNAPSHOT_KEY_ENV}`, e.g. created with `Fernet.generate_key()`"
+        )
+    return Fernet(key)
+
+
+class WriteStatus(StrEnum):
+    CREATED = auto()
+    UPDATED = auto()
+    UNCHANGED = auto()
+    FAILED = auto()
+
+
+@dataclass
+class SecretWriteResult:
+    """Outcome of writing a single secret"""
+
+    key: str
+    status: WriteStatus
+    version: Optional[str] = None
+    error: Optional[Exception] = None
+
+
+def _digest(value: str) -> bytes:
+    return hashlib.sha256(value.encode()).digest()
+
+
 class Secrets(Protocol):
     def __init__(self, **tresor_params):
         ...
@@ -39,50 +126,307 @@ class AzureSecrets:
     """Shopify secrets management on Azure. Create, get, delete secrets, load from file
     """
 
-    def __init__(self, vault_url: str, credential=DefaultAzureCredential()):
+    def __init__(
+        self,
+        vault_url: str,
+        credential=None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        lazy: bool = False,
+        allowed_keys: Optional[Iterable[str]] = None,
+        prefetch_keys: Optional[Iterable[str]] = None,
+        ttl: Optional[float] = None,
+        refresh_interval: Optional[float] = None,
+        snapshot_path: Optional[str] = None,
+    ):
         """Populate secrets dict with Keys/Values from the Azure KeyVault and create
-        an instance attribute for each secret
+        an instance attribute for each secret. Secrets are fetched concurrently.
+
+        In lazy mode no secret is fetched up front. A secret is fetched the first
+        time it's read, e.g. `azsecrets.SHOPDOMAIN`, and kept afterwards.
+
+        With a `ttl` an expired secret is still served while all cached secrets are
+        revalidated in the background with a single list call. Only secrets whose
+        version changed are downloaded again.
+
+        With a `snapshot_path` the secrets are served from the encrypted local
+        snapshot right away and checked against the keyvault versions in the
+        background. The snapshot is written after each check.
 
         Args:
             vault_url (str): _description_
-            credential (_type_): _description_
+            credential (_type_): _description_, the shared `DefaultAzureCredential` if None
+            max_concurrency (int): number of secrets fetched at the same time
+            lazy (bool): fetch secrets on first access instead of all at once
+            allowed_keys (Iterable[str], optional): only these secrets can be read,
+                e.g. `AzSecretKeys`
+            prefetch_keys (Iterable[str], optional): secrets fetched up front in lazy
+                mode, e.g. `AzSecretKeys`
+            ttl (float, optional): seconds until a cached secret is revalidated,
+                never if None
+            refresh_interval (float, optional): seconds between revalidations on a
+                background thread, none if None
+            snapshot_path (str, optional): path of the encrypted local snapshot, the
+                key is read from `AZURIFY_SNAPSHOT_KEY`
         """
         self._secrets = dict()
-        self._secret_client = SecretClient(vault_url=vault_url, credential=credential)
+        self._entries: dict[str, CachedSecret] = dict()
+        self._stats = CacheStats()
+        self._lock = threading.RLock()
+        self._revalidating = False
+        self._secret_client = SecretClient(
+            vault_url=vault_url,
+            credential=credential or azclients.default_credential(),
+            transport=azclients.transport(),
+        )
+        self._lazy = lazy
+        self._allowed_keys = None if allowed_keys is None else {str(k) for k in allowed_keys}
+        self._ttl = ttl
+        self._max_concurrency = max_concurrency
+        self._snapshot_path = snapshot_path
+
+        if snapshot_path is not None and self.load_snapshot(snapshot_path):
+            # one list call in the background instead of fetching every secret
+            self._revalidate_in_background()
+        else:
+            if lazy:
+                keys = [str(key) for key in prefetch_keys or []]
+            else:
+                keys = [
+                    secret.name for secret in self._secret_client.list_properties_of_secrets()
+                ]
+            keys = [key for key in keys if self._is_allowed(key)]
+            self._fetch(keys)
+            if snapshot_path is not None:
+                self.save_snapshot(snapshot_path)
+
+        self._stop_refresh = threading.Event()
+        if refresh_interval is not None:
+            threading.Thread(
+                target=self._refresh_periodically, args=(refresh_interval,), daemon=True
+            ).start()
+
+    def __getattr__(self, key: str) -> str:
+        """Fetch a secret on first access in lazy mode. With a ttl secrets aren't
+        stored as instance attributes, so every access checks the expiry
 
-        for secret in self._secret_client.list_properties_of_secrets():
-            key = secret.name
-            value = self._secret_client.get_secret(secret.name).value
+        Args:
+            key (str): Secret key
+
+        Raises:
+            AttributeError: if neither lazy nor cached with a ttl, the key isn't
+            allowed or the secret doesn't exist
+
+        Returns:
+            str: Secret value
+        """
+        # private attributes are never secrets
+        if key.startswith("_") or not self._is_allowed(key):
+            raise AttributeError(f"`{type(self).__name__}` has no secret `{key}`")
+        if not self._lazy and self._ttl is None:
+            raise AttributeError(f"`{type(self).__name__}` has no secret `{key}`")
+        try:
+            return self.get_secret(key)
+        except ResourceNotFoundError:
+            raise AttributeError(f"Secret `{key}` not found in keyvault") from None
+
+    def _is_allowed(self, key: str) -> bool:
+        return self._allowed_keys is None or key in self._allowed_keys
+
+    def _store(self, key: str, secret) -> None:
+        """Cache a secret
+
+        Args:
+            key (str): Secret key
+            secret (KeyVaultSecret): secret returned by the keyvault
+        """
+        properties = getattr(secret, "properties", None)
+        with self._lock:
+            self._entries[key] = CachedSecret(
+                value=secret.value,
+                version=getattr(properties, "version", None),
+                updated_on=getattr(properties, "updated_on", None),
+            )
             # create entry in secrets dict
-            self._secrets[key] = value
+            self._secrets[key] = secret.value
             # create instance attribute
-            setattr(self, key, value)
+            if self._ttl is None:
+                setattr(self, key, secret.value)
 
-    def load_json(self, path: str) -> None:
-        """Load secrets from file
+    def _remove(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._secrets.pop(key, None)
+            self.__dict__.pop(key, None)
+
+    def _fetch(self, keys: list[str]) -> None:
+        """Fetch secrets from the keyvault concurrently and store them
+
+        Args:
+            keys (list[str]): Secret keys
+        """
+        if not keys:
+            return
+        with ThreadPoolExecutor(max_workers=self._max_concurrency) as pool:
+            for key, secret in zip(keys, pool.map(self._secret_client.get_secret, keys)):
+                self._store(key, secret)
+
+    def refresh(self) -> None:
+        """Revalidate all cached secrets with a single list call. Secrets whose
+        version changed are downloaded again, deleted secrets are removed. When not
+        in lazy mode new secrets are fetched as well
+        """
+        properties = {
+            secret.name: secret for secret in self._secret_client.list_properties_of_secrets()
+        }
+        with self._lock:
+            entries = dict(self._entries)
+        changed = [
+            key
+            for key, entry in entries.items()
+            if key in properties
+            and (properties[key].version, properties[key].updated_on)
+            != (entry.version, entry.updated_on)
+        ]
+        if not self._lazy:
+            changed += [key for key in properties if key not in entries and self._is_allowed(key)]
+        self._fetch(changed)
+
+        now = time.monotonic()
+        with self._lock:
+            for key, entry in entries.items():
+                if key not in properties:
+                    self._remove(key)
+                elif key not in changed and key in self._entries:
+                    self._entries[key] = replace(self._entries[key], fetched_at=now)
+            self._stats.refreshes += len(changed)
+            self._stats.revalidations += 1
+        if self._snapshot_path is not None:
+            self.save_snapshot(self._snapshot_path)
+
+    def _revalidate_in_background(self) -> None:
+        """Start a single background revalidation unless one is running"""
+        with self._lock:
+            if self._revalidating:
+                return
+            self._revalidating = True
+        threading.Thread(target=self._revalidate, daemon=True).start()
+
+    def _revalidate(self) -> None:
+        try:
+            self.refresh()
+        except Exception as error:
+            logging.warning(f"Revalidating secrets failed: {error}")
+        finally:
+            with self._lock:
+                self._revalidating = False
+
+    def _refresh_periodically(self, interval: float) -> None:
+        while not self._stop_refresh.wait(interval):
+            self._revalidate()
+
+    def close(self) -> None:
+        """Stop the periodic background refresh"""
+        self._stop_refresh.set()
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        """Counters of the secrets cache
+
+        Returns:
+            CacheStats: hits, misses and refreshes so far
+        """
+        with self._lock:
+            return replace(self._stats)
+
+    def save_snapshot(self, path: str, key: Optional[str] = None) -> None:
+        """Write the cached secrets and their versions to an encrypted file
+
+        Args:
+            path (str): snapshot path
+            key (str, optional): Fernet key, read from `AZURIFY_SNAPSHOT_KEY` if None
+        """
+        with self._lock:
+            snapshot = {
+                name: {
+                    "value": entry.value,
+                    "version": entry.version,
+                    "updated_on": entry.updated_on.isoformat() if entry.updated_on else None,
+                }
+                for name, entry in self._entries.items()
+            }
+        token = _snapshot_cipher(key).encrypt(json.dumps(snapshot).encode())
+        # write to a temporary file of this writer first, readers never see a partial snapshot.
+        # `mkstemp` creates it readable by the owner only
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with open(fd, "wb") as f:
+                f.write(token)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load_snapshot(self, path: str, key: Optional[str] = None) -> bool:
+        """Cache the secrets of an encrypted snapshot file
+
+        Args:
+            path (str): snapshot path
+            key (str, optional): Fernet key, read from `AZURIFY_SNAPSHOT_KEY` if None
+
+        Returns:
+            bool: False if there's no readable snapshot
+        """
+        try:
+            with open(path, "rb") as f:
+                snapshot = json.loads(_snapshot_cipher(key).decrypt(f.read()))
+        except FileNotFoundError:
+            return False
+        except (InvalidToken, ValueError) as error:
+            logging.warning(f"Ignoring unreadable secrets snapshot `{path}`: {error!r}")
+            return False
+        for name, entry in snapshot.items():
+            if not self._is_allowed(name):
+                continue
+            updated_on = entry["updated_on"]
+            properties = SimpleNamespace(
+                version=entry["version"],
+                updated_on=datetime.fromisoformat(updated_on) if updated_on else None,
+            )
+            self._store(name, SimpleNamespace(value=entry["value"], properties=properties))
+        return True
+
+    def load_json(self, path: str) -> dict[str, "SecretWriteResult"]:
+        """Load secrets from file. Only keys of `AzSecretKeys` are written
 
         Args:
             path (str): JSON path
+
+        Returns:
+            dict[str, SecretWriteResult]: result per secret key
         """
         with open(path) as json_data:
             config_secrets = json.load(json_data)
 
-        # populate
-        for enum in AzSecretKeys:
-            if enum.name in [k for k in config_secrets.keys()]:
-                # create secrets in Azure keyvault
-                self.set_secret(enum.name, config_secrets[enum.name])
-                # create instance attribute
-                setattr(self, enum.name, config_secrets[enum.name])
-            else:
-                # file contains keys which are not allowed
-                logging.warning(
-                    f"Key `{enum.name}` contained in `SecretKey(StrEnum)`but not in `{path}` data: {config_secrets.keys()} "
-                )
+        allowed_keys = {enum.name for enum in AzSecretKeys}
+        missing_keys = allowed_keys - config_secrets.keys()
+        if missing_keys:
+            logging.warning(
+                f"Keys `{sorted(missing_keys)}` contained in `SecretKey(StrEnum)` but not in `{path}` data: {config_secrets.keys()} "
+            )
+        unknown_keys = config_secrets.keys() - allowed_keys
+        if unknown_keys:
+            # file contains keys which are not allowed
+            logging.warning(
+                f"Keys `{sorted(unknown_keys)}` in `{path}` are not contained in `SecretKey(StrEnum)` and ignored"
+            )
+        # create secrets in Azure keyvault and instance attributes
+        return self.set_secrets(
+            {key: value for key, value in config_secrets.items() if key in allowed_keys}
+        )
 
     @property
     def secrets(self) -> dict:
-        """All secrets in dict
+        """All secrets in dict. In lazy mode only the secrets fetched so far
 
         Returns:
             dict: secret key and value
@@ -96,20 +440,81 @@ class AzureSecrets:
             key (str): Secret key
             value (str): Secret value
         """
-        self._secrets[key] = value
-        setattr(self, key, value)
-        self._secret_client.set_secret(key, value)
+        self._store(key, self._secret_client.set_secret(key, value))
+
+    def set_secrets(self, secrets: dict[str, str]) -> dict[str, "SecretWriteResult"]:
+        """Create secrets concurrently. Secrets which already have the value aren't
+        written again, so no needless new versions are created
+
+        Args:
+            secrets (dict[str, str]): Secret keys and values
+
+        Returns:
+            dict[str, SecretWriteResult]: result per secret key, a failing secret
+            doesn't stop the others
+        """
+        with ThreadPoolExecutor(max_workers=self._max_concurrency) as pool:
+            results = pool.map(lambda item: self._write_secret(*item), secrets.items())
+            return {result.key: result for result in results}
+
+    def _write_secret(self, key: str, value: str) -> "SecretWriteResult":
+        """Create a secret unless the keyvault already holds the same value. The
+        latest version is read from the keyvault, the cached one may be stale if
+        another writer rotated the secret
+
+        Args:
+            key (str): Secret key
+            value (str): Secret value
+
+        Returns:
+            SecretWriteResult: what happened to the secret
+        """
+        try:
+            try:
+                self._store(key, self._secret_client.get_secret(key))
+                with self._lock:
+                    entry = self._entries[key]
+            except ResourceNotFoundError:
+                entry = None
+            if entry is not None and hmac.compare_digest(_digest(entry.value), _digest(value)):
+                return SecretWriteResult(key, WriteStatus.UNCHANGED, version=entry.version)
+            self.set_secret(key, value)
+            status = WriteStatus.CREATED if entry is None else WriteStatus.UPDATED
+            return SecretWriteResult(key, status, version=self._entries[key].version)
+        except Exception as error:
+            logging.warning(f"Writing secret `{key}` failed: {error}")
+            return SecretWriteResult(key, WriteStatus.FAILED, error=error)
 
     def get_secret(self, key: str) -> str:
-        """Getter for secret
+        """Getter for secret. The keyvault is only asked if the secret hasn't been
+        fetched yet
 
         Args:
             key (str): Secret key
 
+        Raises:
+            KeyError: if the key isn't allowed
+
         Returns:
-            _type_: Secret value
+            str: Secret value
         """
-        return self._secret_client.get_secret(key)
+        if not self._is_allowed(key):
+            raise KeyError(f"Secret `{key}` is not in the allowed keys")
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+            elif self._ttl is not None and time.monotonic() - entry.fetched_at > self._ttl:
+                self._stats.stale_hits += 1
+            else:
+                self._stats.hits += 1
+                return entry.value
+        if entry is not None:
+            # serve the stale value while the cache is revalidated
+            self._revalidate_in_background()
+            return entry.value
+        self._store(key, self._secret_client.get_secret(key))
+        return self._secrets[key]
 
     def delete_secret(self, key):
         poller = self.keyvault_client.begin_delete_secret(key)
@@ -121,7 +526,7 @@ def main():
     """Simple test case"""
     secrets = AzureSecrets(
         vault_url="https://kv-langerchen.vault.azure.net/",
-        credential=DefaultAzureCredential(),
+        credential=azclients.default_credential(),
     )
 
     print(secrets.SHOPDOMAIN)
@@ -1,24 +1,396 @@
 import io
+import os
+import json
+import mmap
+import time
+import base64
+import hashlib
 import logging
+import tempfile
+import threading
 
-from typing import Protocol
+from typing import BinaryIO, Iterable, Iterator, Optional, Protocol, Union
+from functools import partial
+from contextlib import contextmanager
 from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from azure.storage.blob import ContainerClient
-from azure.identity import DefaultAzureCredential
+from azure.core.exceptions import AzureError, HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobBlock, BlobClient, ContainerClient, ContentSettings
 
-from azurify.azsecrets import AzureSecrets
-from azurify.azconverter import factory, Suffix
+from azurify import azclients, azcompress
+from azurify.azcompress import Codec
+from azurify.azconverter import CONTENT_TYPES, DEFAULT_CHUNK_ROWS, convert_parallel, factory, Schema, Suffix
+
+# defaults for block based uploads
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_BLOCK_RETRIES = 3
+# streamed payloads of incremental uploads are held in memory up to this size
+# and spooled to a temporary file beyond it
+DEFAULT_SPOOL_SIZE = 64 * 1024 * 1024
+
+# in-memory data which is sliced into blocks without copying
+BUFFER_TYPES = (bytes, bytearray, memoryview, io.BytesIO, mmap.mmap)
 
 
 @dataclass
 class ObjectToStore:
     """Object information including name, in which container it should reside
-    and the data to be stored
+    and the data to be stored. The data is held in memory or in an `mmap`,
+    streamed from an iterable of byte chunks or read from a local file given as
+    `pathlib.Path` or open binary file. A `str` is uploaded as UTF-8 text
     """
     object_name: str
     container_name: str
-    data_to_store: io.BytesIO
+    data_to_store: Union[bytes, io.BytesIO, str, os.PathLike, BinaryIO, mmap.mmap, Iterable[bytes]]
+    content_type: Optional[str] = None
+    content_encoding: Optional[str] = None
+
+
+def is_local_file(data) -> bool:
+    """Data is a file path or an open file with a file descriptor
+
+    Args:
+        data: data of an `ObjectToStore`
+
+    Returns:
+        bool: True if the data can be read by offset
+    """
+    # a str is content, e.g. the output of `DataFrame.to_csv()`
+    if isinstance(data, os.PathLike):
+        return True
+    if isinstance(data, io.IOBase) and not isinstance(data, io.BytesIO):
+        try:
+            data.fileno()
+        except OSError:
+            return False
+        return True
+    return False
+
+
+@contextmanager
+def open_file(data) -> Iterator[BinaryIO]:
+    """Open a file path, an open file is used as is and stays open
+
+    Args:
+        data (os.PathLike | BinaryIO): file
+
+    Yields:
+        BinaryIO: file opened for reading bytes
+    """
+    if isinstance(data, os.PathLike):
+        with open(data, "rb") as f:
+            yield f
+    else:
+        yield data
+
+
+# reads by offset without moving the file position, not available on Windows
+_pread = getattr(os, "pread", None)
+_seek_lock = threading.Lock()
+
+
+def _read_at(file: BinaryIO, size: int, offset: int) -> bytes:
+    """Read by offset with seek and read, the file position is restored"""
+    with _seek_lock:
+        position = file.tell()
+        try:
+            file.seek(offset)
+            return file.read(size)
+        finally:
+            file.seek(position)
+
+
+def file_blocks(file: BinaryIO, block_size: int) -> Iterator[bytes]:
+    """Read a complete file block by block by offset, the file position isn't used,
+    so only the blocks being uploaded are held in memory
+
+    Args:
+        file (BinaryIO): file with a file descriptor
+        block_size (int): size of a block
+
+    Yields:
+        bytes: next block
+    """
+    read = partial(_pread, file.fileno()) if _pread is not None else partial(_read_at, file)
+    offset = 0
+    while block := read(block_size, offset):
+        yield block
+        offset += len(block)
+
+
+@contextmanager
+def data_view(data) -> Iterator[memoryview]:
+    """View of in-memory data or a memory map without copying
+
+    Args:
+        data (bytes | io.BytesIO | mmap.mmap | memoryview): data, e.g. a region
+            of a memory map as `memoryview(mapped)[start:end]`
+
+    Yields:
+        memoryview: view of the data, released on exit
+    """
+    view = data.getbuffer() if isinstance(data, io.BytesIO) else memoryview(data)
+    try:
+        yield view
+    finally:
+        view.release()
+
+
+def block_id(index: int) -> str:
+    """Block ids of a blob must be base64 strings of equal length
+
+    Args:
+        index (int): position of the block in the blob
+
+    Returns:
+        str: block id
+    """
+    return base64.b64encode(f"{index:08d}".encode()).decode()
+
+
+def split_blocks(data, block_size: int) -> Iterator[memoryview]:
+    """Split data into slices of `block_size` bytes without copying
+
+    Args:
+        data (bytes | io.BytesIO): data to split
+        block_size (int): max. size of a slice
+
+    Yields:
+        memoryview: next slice
+    """
+    if block_size < 1:
+        raise ValueError(f"`block_size` must be positive, got {block_size}")
+    if isinstance(data, memoryview):
+        view = data
+    else:
+        view = data.getbuffer() if isinstance(data, io.BytesIO) else memoryview(data)
+    for offset in range(0, len(view), block_size):
+        yield view[offset : offset + block_size]
+
+
+def rebuffer(chunks: Iterable[bytes], block_size: int) -> Iterator[bytes]:
+    """Join byte chunks of any size into blocks of `block_size` bytes. Only the last
+    block may be smaller
+
+    Args:
+        chunks (Iterable[bytes]): byte chunks, e.g. converted data
+        block_size (int): size of a block
+
+    Yields:
+        bytes: next block
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= block_size:
+            view = memoryview(buffer)
+            offset = 0
+            while len(buffer) - offset >= block_size:
+                yield bytes(view[offset : offset + block_size])
+                offset += block_size
+            view.release()
+            del buffer[:offset]
+    if buffer:
+        yield bytes(buffer)
+
+
+class ContainerCache:
+    """Containers known to exist, keyed by storage account and container name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._containers = set()
+
+    @staticmethod
+    def key(container) -> tuple[str, str]:
+        return (container.account_name, container.container_name)
+
+    def __contains__(self, container) -> bool:
+        with self._lock:
+            return self.key(container) in self._containers
+
+    def add(self, container) -> None:
+        with self._lock:
+            self._containers.add(self.key(container))
+
+    def discard(self, container) -> None:
+        with self._lock:
+            self._containers.discard(self.key(container))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._containers.clear()
+
+
+# containers confirmed or created by this process
+known_containers = ContainerCache()
+
+
+def ensure_container(container: ContainerClient) -> None:
+    """Create a container unless it's known to exist. The first call costs a single
+    request, later calls for the same container none. Credentials which may not
+    create containers, e.g. a container SAS or a data-only role, check that it exists
+
+    Args:
+        container (ContainerClient): Azure object for handling blob container operations
+
+    Raises:
+        HttpResponseError: if the container can't be created and doesn't exist
+    """
+    if container in known_containers:
+        return
+    try:
+        container.create_container()
+        logging.info(f"Created container `{container.container_name}` because it didn't exist.")
+    except ResourceExistsError:
+        # exists already or another worker created it in the meantime
+        pass
+    except HttpResponseError as error:
+        if error.status_code != 403 or not _container_exists(container):
+            raise
+    known_containers.add(container)
+
+
+def _container_exists(container: ContainerClient) -> bool:
+    try:
+        return container.exists()
+    except HttpResponseError as error:
+        if error.status_code != 403:
+            raise
+        # a container SAS can't read the properties either, uploading to a
+        # missing container fails later
+        return True
+
+
+def is_container_not_found(error: Exception) -> bool:
+    """A request failed because the container was deleted in the meantime"""
+    return isinstance(error, ResourceNotFoundError) and error.error_code == "ContainerNotFound"
+
+
+def spool(chunks: Iterable[bytes], max_size: int = DEFAULT_SPOOL_SIZE):
+    """Write chunks to a temporary file and compute their MD5 on the way
+
+    Args:
+        chunks (Iterable[bytes]): data, e.g. `Converter.convert_iter`
+        max_size (int): bytes held in memory before the file is written to disk
+
+    Returns:
+        tuple[SpooledTemporaryFile, bytes, int]: file positioned at the start,
+        MD5 digest and size of the data
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=max_size)
+    md5 = hashlib.md5()
+    size = 0
+    for chunk in chunks:
+        md5.update(chunk)
+        file.write(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return file, md5.digest(), size
+
+
+class UploadManifest:
+    """Local record of the MD5 of uploaded blobs. Incremental uploads compare with
+    the manifest instead of requesting the properties of every blob"""
+
+    def __init__(self, path: str):
+        """Read the digests of a previous run from `path`
+
+        Args:
+            path (str): JSON file, created by `save` if it doesn't exist
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._digests = dict()
+        if os.path.exists(path):
+            with open(path) as f:
+                self._digests = json.load(f)
+
+    def get(self, container_name: str, object_name: str) -> Optional[str]:
+        """MD5 of the last upload as hex string, None if unknown"""
+        with self._lock:
+            return self._digests.get(f"{container_name}/{object_name}")
+
+    def update(self, container_name: str, object_name: str, digest: str) -> None:
+        with self._lock:
+            self._digests[f"{container_name}/{object_name}"] = digest
+
+    def save(self) -> None:
+        """Replace the file atomically, through a temporary file of this writer"""
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+            try:
+                with open(fd, "w") as f:
+                    json.dump(self._digests, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+
+class UploadJournal:
+    """Local checkpoint of a block upload. Every staged block is appended as a JSON
+    line with its id, offset, size and MD5, so an interrupted upload can resume"""
+
+    def __init__(self, path: str, container_name: str, object_name: str, block_size: int):
+        """Journal of the upload of one blob, nothing is read before `staged`
+
+        Args:
+            path (str): journal file, removed once the blob is committed
+            container_name (str): name of the blob container
+            object_name (str): name of the blob
+            block_size (int): size of a block in bytes, a journal written with
+                another block size is discarded
+        """
+        self.path = path
+        self.header = {"container": container_name, "blob": object_name, "block_size": block_size}
+        self._lock = threading.Lock()
+
+    def _entries(self) -> list[dict]:
+        try:
+            with open(self.path) as f:
+                lines = [json.loads(line) for line in f if line.endswith("\n")]
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+        if not lines or lines[0] != self.header:
+            return []
+        return lines[1:]
+
+    def staged(self, blob_client: BlobClient) -> dict[str, dict]:
+        """Blocks of an earlier attempt which are still staged on the blob, and
+        start the journal of this attempt with them
+
+        Args:
+            blob_client (BlobClient): Azure object for handling blob operations
+
+        Returns:
+            dict[str, dict]: journal entry by block id
+        """
+        entries = self._entries()
+        if entries:
+            try:
+                _, uncommitted = blob_client.get_block_list("uncommitted")
+            except ResourceNotFoundError:
+                uncommitted = []
+            sizes = {block.id: block.size for block in uncommitted}
+            entries = [entry for entry in entries if sizes.get(entry["id"]) == entry["size"]]
+        with self._lock, open(self.path, "w") as f:
+            for line in [self.header, *entries]:
+                f.write(json.dumps(line) + "\n")
+        return {entry["id"]: entry for entry in entries}
+
+    def record(self, key: str, offset: int, size: int, md5: str) -> None:
+        """Append a staged block"""
+        line = json.dumps({"id": key, "offset": offset, "size": size, "md5": md5}) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+    def remove(self) -> None:
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
 
 
 class CloudStorageUploader(Protocol):
@@ -34,20 +406,40 @@ class CloudStorageUploader(Protocol):
 class AzureBlobUploader:
     """Handler for storing data in Azure Blob Storage"""
 
-    def __init__(self, object_to_store: ObjectToStore, conn_str: str):
+    def __init__(
+        self,
+        object_to_store: ObjectToStore,
+        conn_str: str,
+        create_container: bool = True,
+        manifest: Optional[UploadManifest] = None,
+    ):
         """_summary_
 
         Args:
             storage_object (ObjectToStore): contains filename, container/folder and data
             conn_str (str): Azure storage connection string
+            create_container (bool): create the container if it doesn't exist, skip
+                the check if it's known to exist
+            manifest (UploadManifest, optional): local record of uploaded content,
+                used instead of the blob's properties to skip unchanged uploads
         """
         # unpack ObjectToStore
         self.container_name = object_to_store.container_name
         self.file_name = object_to_store.object_name
-        self.data_to_store = object_to_store.data_to_store
+        data = object_to_store.data_to_store
+        # text is uploaded as UTF-8 like `upload_blob` does, a path is a `pathlib.Path`
+        self.data_to_store = data.encode() if isinstance(data, str) else data
+        self.content_settings = ContentSettings(
+            content_type=object_to_store.content_type,
+            content_encoding=object_to_store.content_encoding,
+        )
 
         # Azure Storage Connection String
         self.conn_str = conn_str
+        self.create_container = create_container
+        self.manifest = manifest
+        # True if the last upload was skipped because the content was unchanged
+        self.skipped = False
 
     def _container(self) -> ContainerClient:
         """Getter for container. If container doesn't exist, it's created
@@ -55,46 +447,561 @@ class AzureBlobUploader:
         Returns:
             ContainerClient: Azure object for handling blob container operations
         """
-        container = ContainerClient.from_connection_string(
-            conn_str=self.conn_str, container_name=self.container_name
-        )
-        if not container.exists:
-            container.create_container()
+        container = azclients.container_client(self.conn_str, self.container_name)
+        if self.create_container:
+            ensure_container(container)
+
+        return container
+
+    def _recreate_container(self, error: Exception) -> bool:
+        """Forget a container which was deleted in the meantime and create it again
+
+        Args:
+            error (Exception): error of the failed request
+
+        Returns:
+            bool: True if the request can be retried
+        """
+        if not is_container_not_found(error):
+            return False
+        container = azclients.container_client(self.conn_str, self.container_name)
+        known_containers.discard(container)
+        ensure_container(container)
+        return True
+
+    def _unchanged(self, digest: bytes) -> bool:
+        """Compare the MD5 of the data with the manifest or the existing blob
+
+        Args:
+            digest (bytes): MD5 of the data
+
+        Returns:
+            bool: True if the blob has the same content
+        """
+        if self.manifest is not None:
+            unchanged = self.manifest.get(self.container_name, self.file_name) == digest.hex()
+        else:
+            try:
+                properties = self._container().get_blob_client(self.file_name).get_blob_properties()
+                unchanged = properties.content_settings.content_md5 == bytearray(digest)
+            except ResourceNotFoundError:
+                unchanged = False
+        if unchanged:
             logging.info(
-                f"Created container `{self.container_name}` because it didn't exist."
+                f"Skipped blob `{self.file_name}` in container `{self.container_name}` because it's unchanged"
             )
+        self.skipped = unchanged
+        # the service keeps the MD5 of the committed blob for the next comparison
+        self.content_settings.content_md5 = bytearray(digest)
+        return unchanged
 
-        return container
+    def _uploaded(self, digest: Optional[bytes]) -> None:
+        if digest is not None and self.manifest is not None:
+            self.manifest.update(self.container_name, self.file_name, digest.hex())
+
+    def _size(self) -> int:
+        if isinstance(self.data_to_store, io.BytesIO):
+            return self.data_to_store.getbuffer().nbytes
+        return len(self.data_to_store)
+
+    def upload(self, skip_unchanged: bool = False) -> int:
+        """Upload the data to Azure blob. Local files, streams and iterables of
+        byte chunks are uploaded in parallel blocks with `upload_blocks`
+
+        Args:
+            skip_unchanged (bool): don't upload if the blob has the same MD5
 
-    def upload(self):
-        """Upload the data to Azure blob"""
+        Returns:
+            int: size of the data in bytes, `skipped` tells if it was uploaded
+        """
+        data = self.data_to_store
+        if is_local_file(data) or isinstance(data, mmap.mmap) or not isinstance(data, BUFFER_TYPES):
+            return self.upload_blocks(skip_unchanged=skip_unchanged)
+        digest = None
+        if skip_unchanged:
+            digest = hashlib.md5(data.getbuffer() if isinstance(data, io.BytesIO) else data).digest()
+            if self._unchanged(digest):
+                return self._size()
         container = self._container()
         blob_client = container.get_blob_client(self.file_name)
-        blob_client.upload_blob(self.data_to_store, overwrite=True)
+        # a retry sends a stream again from where the first attempt started
+        position = data.tell() if isinstance(data, io.IOBase) and data.seekable() else None
+        retryable = position is not None or isinstance(data, (bytes, bytearray, memoryview, mmap.mmap))
+        try:
+            blob_client.upload_blob(data, overwrite=True, content_settings=self.content_settings)
+        except ResourceNotFoundError as error:
+            # a one-shot iterable was consumed by the first attempt
+            if not retryable or not self._recreate_container(error):
+                raise
+            if position is not None:
+                data.seek(position)
+            blob_client.upload_blob(data, overwrite=True, content_settings=self.content_settings)
         logging.info(
             f"Created blob `{self.file_name}` in container `{self.container_name}`"
         )
+        self._uploaded(digest)
+        return self._size()
+
+    def upload_blocks(
+        self,
+        block_size: Optional[int] = DEFAULT_BLOCK_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        retries: int = DEFAULT_BLOCK_RETRIES,
+        skip_unchanged: bool = False,
+        journal_path: Optional[str] = None,
+    ) -> int:
+        """Upload the data to Azure blob in blocks which are staged in parallel and
+        committed once all of them arrived. Only failed blocks are retried.
+
+        Bytes and memory maps are sliced into blocks without copying. Local files
+        are read block by block by offset. Any other iterable of byte chunks, e.g.
+        `Converter.convert_iter`, or a stream without file descriptor is consumed
+        while earlier blocks are uploaded. At most `2 * max_concurrency` blocks are
+        held in memory.
+
+        With `skip_unchanged` the MD5 of the data is compared with the existing blob
+        first. Streamed chunks are spooled to a temporary file while they're hashed.
+
+        Without `block_size` every chunk of an iterable is staged as a block of its
+        own, e.g. the shards of `convert_parallel`. Azure accepts blocks of up to
+        4000 MiB and 50000 blocks per blob.
+
+        With `journal_path` the upload is resumable. Staged blocks are recorded in
+        the journal, a later call with the same journal skips blocks which are
+        still staged on the blob and have the same content. The journal is removed
+        once the blob is committed.
+
+        Args:
+            block_size (int, optional): size of a block in bytes, None stages the
+                chunks of an iterable as they are
+            max_concurrency (int): number of blocks staged at the same time
+            retries (int): number of retries for a failed block
+            skip_unchanged (bool): don't upload if the blob has the same MD5
+            journal_path (str, optional): local journal of the staged blocks
+
+        Returns:
+            int: size of the data in bytes, `skipped` tells if it was uploaded
+        """
+        data = self.data_to_store
+        chunk_blocks = block_size is None
+        # files, buffers and spooled chunks are still split into blocks
+        block_size = block_size or DEFAULT_BLOCK_SIZE
+        journal = None
+        if journal_path is not None:
+            journal = UploadJournal(journal_path, self.container_name, self.file_name, block_size)
+        if isinstance(data, io.IOBase) and not isinstance(data, io.BytesIO) and not is_local_file(data):
+            # a stream without file descriptor is read block by block
+            data = iter(partial(data.read, block_size), b"")
+        digest = None
+        if is_local_file(data):
+            with open_file(data) as file:
+                if skip_unchanged:
+                    md5 = hashlib.md5()
+                    for block in file_blocks(file, block_size):
+                        md5.update(block)
+                    digest = md5.digest()
+                    if self._unchanged(digest):
+                        return os.fstat(file.fileno()).st_size
+                blocks = file_blocks(file, block_size)
+                size = self._upload_blocks(blocks, block_size, max_concurrency, retries, journal)
+        elif isinstance(data, BUFFER_TYPES):
+            with data_view(data) as view:
+                if skip_unchanged:
+                    digest = hashlib.md5(view).digest()
+                    if self._unchanged(digest):
+                        return view.nbytes
+                size = self._upload_blocks(view, block_size, max_concurrency, retries, journal)
+        elif skip_unchanged:
+            file, digest, size = spool(data)
+            with file:
+                if self._unchanged(digest):
+                    return size
+                chunks = iter(partial(file.read, block_size), b"")
+                self._upload_blocks(chunks, block_size, max_concurrency, retries, journal)
+        else:
+            size = self._upload_blocks(data, None if chunk_blocks else block_size, max_concurrency, retries, journal)
+        self._uploaded(digest)
+        return size
+
+    def _upload_blocks(
+        self,
+        data,
+        block_size: Optional[int],
+        max_concurrency: int,
+        retries: int,
+        journal: Optional[UploadJournal] = None,
+    ) -> int:
+        if isinstance(data, BUFFER_TYPES):
+            blocks = split_blocks(data, block_size)
+        elif block_size is None:
+            # Azure rejects empty blocks
+            blocks = filter(None, data)
+        else:
+            blocks = rebuffer(data, block_size)
+
+        blob_client = self._container().get_blob_client(self.file_name)
+        staged = journal.staged(blob_client) if journal is not None else dict()
+        block_ids = []
+        size = 0
+        resumed = 0
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            for index, block in enumerate(blocks):
+                key = block_id(index)
+                block_ids.append(key)
+                offset, size = size, size + len(block)
+                if journal is not None:
+                    md5 = hashlib.md5(block).hexdigest()
+                    entry = staged.get(key)
+                    if entry is not None and entry["offset"] == offset and entry["md5"] == md5:
+                        resumed += 1
+                        if isinstance(block, memoryview):
+                            block.release()
+                        continue
+                # wait for a free slot before the next block is read
+                if len(in_flight) >= 2 * max_concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                stage = self._stage_block
+                if journal is not None:
+                    stage = partial(self._stage_journaled, journal=journal, offset=offset, md5=md5)
+                in_flight.add(pool.submit(stage, blob_client, key, block, retries))
+            for future in in_flight:
+                future.result()
+        blob_client.commit_block_list(
+            [BlobBlock(block_id=key) for key in block_ids], content_settings=self.content_settings
+        )
+        if journal is not None:
+            journal.remove()
+        if resumed:
+            logging.info(f"Resumed blob `{self.file_name}`, {resumed} block(s) were already staged")
+        logging.info(
+            f"Created blob `{self.file_name}` with {len(block_ids)} block(s) in container `{self.container_name}`"
+        )
+        return size
+
+    def _stage_journaled(
+        self,
+        blob_client: BlobClient,
+        key: str,
+        block,
+        retries: int,
+        journal: UploadJournal,
+        offset: int,
+        md5: str,
+    ) -> None:
+        """Stage a single block and record it in the journal"""
+        size = len(block)
+        self._stage_block(blob_client, key, block, retries)
+        journal.record(key, offset, size, md5)
+
+    def _stage_block(self, blob_client: BlobClient, key: str, block, retries: int) -> None:
+        """Stage a single block, retry with backoff if it fails
+
+        Args:
+            blob_client (BlobClient): Azure object for handling blob operations
+            key (str): block id
+            block (bytes): block data
+            retries (int): number of retries
+        """
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    blob_client.stage_block(key, block)
+                    return
+                except AzureError as error:
+                    if attempt == retries:
+                        raise
+                    logging.warning(
+                        f"Staging block `{key}` of `{self.file_name}` failed (attempt {attempt + 1}): {error}"
+                    )
+                    if not self._recreate_container(error):
+                        time.sleep(2**attempt)
+        finally:
+            # slices of a memory-mapped file must be released before it's closed,
+            # even if a traceback still references them
+            if isinstance(block, memoryview):
+                block.release()
+
+
+@dataclass
+class UploadResult:
+    """Outcome of uploading a single object"""
+
+    object_name: str
+    container_name: str
+    size: int = 0
+    seconds: float = 0.0
+    error: Optional[Exception] = None
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class UploadSummary:
+    """Totals of a batch of uploads"""
+
+    uploaded: int = 0
+    skipped: int = 0
+    failed: int = 0
+    uploaded_bytes: int = 0
+    skipped_bytes: int = 0
+
+    @classmethod
+    def from_results(cls, results: Iterable[UploadResult]) -> "UploadSummary":
+        summary = cls()
+        for result in results:
+            if not result.ok:
+                summary.failed += 1
+            elif result.skipped:
+                summary.skipped += 1
+                summary.skipped_bytes += result.size
+            else:
+                summary.uploaded += 1
+                summary.uploaded_bytes += result.size
+        return summary
+
+
+class BatchBlobUploader:
+    """Upload many objects through a shared pool of workers"""
+
+    def __init__(
+        self,
+        conn_str: str,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        skip_unchanged: bool = False,
+        manifest: Optional[UploadManifest] = None,
+    ):
+        """Uploader for the objects of one storage account
+
+        Args:
+            conn_str (str): Azure storage connection string
+            max_concurrency (int): number of objects uploaded at the same time
+            block_size (int): objects streamed from an iterable are uploaded in
+                blocks of this size
+            skip_unchanged (bool): don't upload objects whose blob has the same MD5
+            manifest (UploadManifest, optional): local record of uploaded content,
+                saved after every batch
+        """
+        self.conn_str = conn_str
+        self.max_concurrency = max_concurrency
+        self.block_size = block_size
+        self.skip_unchanged = skip_unchanged
+        self.manifest = manifest
+
+    def upload_many(self, objects: Iterable[ObjectToStore]) -> list[UploadResult]:
+        """Upload objects in parallel. Every container is created or verified once.
+        A failing object doesn't stop the others
+
+        Args:
+            objects (Iterable[ObjectToStore]): objects to upload
+
+        Returns:
+            list[UploadResult]: result per object in the order of `objects`
+        """
+        objects = list(objects)
+        container_errors = dict()
+        for container_name in {o.container_name for o in objects}:
+            try:
+                ensure_container(azclients.container_client(self.conn_str, container_name))
+            except AzureError as error:
+                container_errors[container_name] = error
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            results = list(
+                pool.map(lambda o: self._upload(o, container_errors.get(o.container_name)), objects)
+            )
+        if self.manifest is not None:
+            self.manifest.save()
+        summary = UploadSummary.from_results(results)
+        logging.info(
+            f"Uploaded {summary.uploaded} of {len(results)} objects ({summary.uploaded_bytes} bytes), "
+            f"skipped {summary.skipped} unchanged ({summary.skipped_bytes} bytes), {summary.failed} failed"
+        )
+        return results
+
+    def _upload(
+        self, object_to_store: ObjectToStore, container_error: Optional[Exception] = None
+    ) -> UploadResult:
+        result = UploadResult(
+            object_name=object_to_store.object_name,
+            container_name=object_to_store.container_name,
+            error=container_error,
+        )
+        if container_error is not None:
+            return result
+        uploader = AzureBlobUploader(
+            object_to_store=object_to_store,
+            conn_str=self.conn_str,
+            create_container=False,
+            manifest=self.manifest,
+        )
+        start = time.perf_counter()
+        try:
+            if isinstance(object_to_store.data_to_store, BUFFER_TYPES):
+                result.size = uploader.upload(skip_unchanged=self.skip_unchanged)
+            else:
+                result.size = uploader.upload_blocks(
+                    block_size=self.block_size, max_concurrency=1, skip_unchanged=self.skip_unchanged
+                )
+            result.skipped = uploader.skipped
+        except Exception as error:
+            logging.warning(
+                f"Uploading `{result.object_name}` to container `{result.container_name}` failed: {error}"
+            )
+            result.error = error
+        result.seconds = time.perf_counter() - start
+        return result
+
+
+@dataclass
+class ExportResult:
+    """Summary of an exported blob"""
+
+    object_name: str
+    container_name: str
+    size: int
+    skipped: bool = False
+
+
+def converted_object(
+    rows: Iterable[dict],
+    suffix: str,
+    container_name: str,
+    object_name: str,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    codec: Optional[Union[str, Codec]] = None,
+    schema: Union[Schema, bool, None] = None,
+    max_workers: Optional[int] = None,
+) -> ObjectToStore:
+    """Object whose data are the lazily converted and compressed records
+
+    Args:
+        rows (Iterable[dict]): records, e.g. a generator
+        suffix (str): output format, e.g. `csv`
+        container_name (str): name of the blob container
+        object_name (str): name of the blob
+        chunk_rows (int): number of records encoded at once
+        codec (str | Codec, optional): compress with `gzip`, `zstd` or `lz4` on all
+            cores, the codec's suffix is added to `object_name`, e.g. `.csv.gz`
+        schema (Schema | bool, optional): flatten and type the records before
+            they're converted, True infers the schema from the first chunk
+        max_workers (int, optional): encode chunks of CSV, JSON or NDJSON in that
+            many processes with `convert_parallel`
+
+    Returns:
+        ObjectToStore: object streaming the converted chunks
+    """
+    options = {"schema": schema} if schema is not None else {}
+    if max_workers is not None:
+        chunks = convert_parallel(suffix, rows, chunk_rows=chunk_rows, max_workers=max_workers, **options)
+    else:
+        chunks = factory(suffix).convert_iter(rows, chunk_rows=chunk_rows, **options)
+    content_encoding = None
+    if codec is not None:
+        codec = azcompress.codec(codec) if isinstance(codec, str) else codec
+        chunks = azcompress.compress_iter(rebuffer(chunks, azcompress.DEFAULT_FRAME_SIZE), codec)
+        content_encoding = codec.content_encoding
+        if not object_name.endswith(f".{codec.suffix}"):
+            object_name = f"{object_name}.{codec.suffix}"
+    return ObjectToStore(
+        object_name=object_name,
+        container_name=container_name,
+        data_to_store=chunks,
+        content_type=CONTENT_TYPES.get(suffix),
+        content_encoding=content_encoding,
+    )
+
+
+def export(
+    rows: Iterable[dict],
+    suffix: str,
+    container_name: str,
+    object_name: str,
+    conn_str: str,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    codec: Optional[Union[str, Codec]] = None,
+    skip_unchanged: bool = False,
+    manifest: Optional[UploadManifest] = None,
+    journal_path: Optional[str] = None,
+    schema: Union[Schema, bool, None] = None,
+    max_workers: Optional[int] = None,
+) -> ExportResult:
+    """Convert records and upload them to Azure blob without creating the complete
+    file in memory. Converted chunks are staged as blocks while the next chunks
+    are encoded.
+
+    Args:
+        rows (Iterable[dict]): records, e.g. a generator
+        suffix (str): output format, e.g. `csv`
+        container_name (str): name of the blob container
+        object_name (str): name of the blob
+        conn_str (str): Azure storage connection string
+        chunk_rows (int): number of records encoded at once
+        block_size (int): size of a block in bytes
+        max_concurrency (int): number of blocks staged at the same time
+        codec (str | Codec, optional): compress with `gzip`, `zstd` or `lz4` on all
+            cores, the codec's suffix is added to `object_name`, e.g. `.csv.gz`
+        skip_unchanged (bool): don't upload if the blob has the same MD5, the
+            converted data is spooled to a temporary file to compute it
+        manifest (UploadManifest, optional): local record of uploaded content,
+            saved after the export
+        journal_path (str, optional): local journal of the staged blocks, an
+            interrupted export resumes with the blocks staged before
+        schema (Schema | bool, optional): flatten and type the records before
+            they're converted, True infers the schema from the first chunk
+        max_workers (int, optional): encode CSV, JSON or NDJSON in that many
+            processes, every encoded chunk of `chunk_rows` records is staged as a
+            block of its own unless it's compressed
+
+    Returns:
+        ExportResult: name and size of the created blob
+    """
+    object_to_store = converted_object(
+        rows, suffix, container_name, object_name, chunk_rows, codec, schema, max_workers
+    )
+    uploader = AzureBlobUploader(object_to_store=object_to_store, conn_str=conn_str, manifest=manifest)
+    size = uploader.upload_blocks(
+        block_size=None if max_workers is not None and codec is None else block_size,
+        max_concurrency=max_concurrency,
+        skip_unchanged=skip_unchanged,
+        journal_path=journal_path,
+    )
+    if manifest is not None:
+        manifest.save()
+    return ExportResult(
+        object_name=object_to_store.object_name,
+        container_name=container_name,
+        size=size,
+        skipped=uploader.skipped,
+    )
 
 
 def main():
+    from azurify.azsecrets import AzureSecrets
+
     print(f"executing {__name__} in {__file__}")
     data = [{"createdAt": 2021, "price": 10}, {"createdAt": 2022, "price": 20}]
     suffix = Suffix.CSV
-    converter = factory(suffix)
-    converted_data = converter.convert(data).data
-
-    object_to_store = ObjectToStore(
-        object_name=f"data.{suffix}",
-        container_name="testcontainer2",
-        data_to_store=converted_data,
-    )
 
     conn_str = AzureSecrets(
         vault_url="https://kv-langerchen.vault.azure.net/",
-        credential=DefaultAzureCredential(),
+        credential=azclients.default_credential(),
     ).AZSTORAGECONNSTR
 
-    AzureBlobUploader(object_to_store=object_to_store, conn_str=conn_str).upload()
+    export(
+        rows=data,
+        suffix=suffix,
+        container_name="testcontainer2",
+        object_name=f"data.{suffix}",
+        conn_str=conn_str,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,311 @@
+# Testing the async uploader against the Azurite emulator, see test_azstorage.py
+
+import asyncio
+import io
+import mmap
+import os
+import random
+import string
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import aiohttp
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import ContainerClient
+
+import azaio
+from azaio import AsyncAzureBlobUploader, AsyncAzureSecrets, AsyncKeyvault, transport
+from azstorage import ObjectToStore, known_containers
+
+AZURITE_CONNECTION_STRING = os.environ.get("AZURITE_CONNECTION_STRING")
+
+
+class TestTransport(unittest.TestCase):
+    def test_shared_session(self):
+        async def shared():
+            async with aiohttp.ClientSession() as session:
+                return transport(session).session is session
+
+        self.assertTrue(asyncio.run(shared()))
+
+
+class FakeAsyncClient:
+    """Closable like the async Azure clients"""
+
+    closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+        self.staged = dict()
+
+    async def stage_block(self, block_id, data):
+        await asyncio.sleep(0)
+        self.staged[block_id] = bytes(data)
+
+    async def commit_block_list(self, blocks, content_settings=None):
+        self.container.blobs[self.name] = b"".join(self.staged[block.id] for block in blocks)
+
+    async def upload_blob(self, data, overwrite=False, content_settings=None):
+        self.container.blobs[self.name] = data if isinstance(data, bytes) else b"".join(data)
+
+
+class FakeAsyncContainerClient(FakeAsyncClient):
+    """In-memory container created by `from_connection_string`"""
+
+    containers = dict()
+
+    def __init__(self, container_name):
+        self.account_name = "fake"
+        self.container_name = container_name
+        self.blobs = self.containers.setdefault(container_name, dict())
+
+    @classmethod
+    def from_connection_string(cls, conn_str, container_name, transport=None):
+        return cls(container_name)
+
+    async def create_container(self):
+        raise ResourceExistsError("exists")
+
+    def get_blob_client(self, name):
+        return FakeAsyncBlobClient(self, name)
+
+
+class FakeAsyncSecretClient(FakeAsyncClient):
+    vault = dict()
+
+    def __init__(self, vault_url, credential, transport=None):
+        self.vault_url = vault_url
+
+    async def list_properties_of_secrets(self):
+        for name in list(self.vault):
+            yield SimpleNamespace(name=name)
+
+    async def get_secret(self, name):
+        await asyncio.sleep(0)
+        return SimpleNamespace(name=name, value=self.vault[name])
+
+    async def set_secret(self, name, value):
+        await asyncio.sleep(0)
+        self.vault[name] = value
+        return SimpleNamespace(name=name, value=value)
+
+
+class FakePoller:
+    def __init__(self, result):
+        self._result = result
+
+    async def result(self):
+        return self._result
+
+
+class FakeAsyncVaults:
+    def __init__(self):
+        self.vaults = dict()
+
+    async def begin_create_or_update(self, group_name, name, parameters):
+        self.vaults[group_name, name] = parameters
+        return FakePoller(parameters)
+
+    async def get(self, group_name, name):
+        return self.vaults[group_name, name]
+
+    async def delete(self, group_name, name):
+        del self.vaults[group_name, name]
+
+
+class FakeAsyncKeyVaultManagementClient(FakeAsyncClient):
+    def __init__(self, credential, subscription_id, transport=None):
+        self.subscription_id = subscription_id
+        self.vaults = FakeAsyncVaults()
+
+
+class TestAsyncAzureBlobUploaderOffline(unittest.TestCase):
+    """Upload the payloads of the sync uploader into an in-memory container"""
+
+    def setUp(self):
+        FakeAsyncContainerClient.containers.clear()
+        patcher = mock.patch.object(azaio, "ContainerClient", FakeAsyncContainerClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(known_containers.clear)
+        self.data = os.urandom(10_000)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "data.bin"
+        self.path.write_bytes(self.data)
+
+    def upload(self, data, blocks=True):
+        async def run():
+            async with AsyncAzureBlobUploader(ObjectToStore("data.bin", "test", data), conn_str="fake") as uploader:
+                if blocks:
+                    return await uploader.upload_blocks(block_size=1024, max_concurrency=3)
+                await uploader.upload()
+
+        size = asyncio.run(run())
+        return size, FakeAsyncContainerClient.containers["test"]["data.bin"]
+
+    def test_payloads(self):
+        with open(self.path, "rb") as file, open(self.path, "r+b") as mapped:
+            memory_map = mmap.mmap(mapped.fileno(), 0)
+            payloads = {
+                "bytes": self.data,
+                "bytearray": bytearray(self.data),
+                "BytesIO": io.BytesIO(self.data),
+                "path": self.path,
+                "file": file,
+                "mmap": memory_map,
+                "stream": io.BufferedReader(io.BytesIO(self.data)),
+                "chunks": (self.data[i : i + 700] for i in range(0, len(self.data), 700)),
+            }
+            for kind, data in payloads.items():
+                with self.subTest(kind):
+                    self.assertEqual(self.upload(data), (len(self.data), self.data))
+            memory_map.close()
+
+    def test_text(self):
+        text = "Grüße,\n" * 500
+        self.assertEqual(self.upload(text), (len(text.encode()), text.encode()))
+        self.assertEqual(self.upload(text, blocks=False)[1], text.encode())
+
+    def test_upload_path(self):
+        self.assertEqual(self.upload(self.path, blocks=False)[1], self.data)
+
+    def test_close(self):
+        async def run():
+            uploader = AsyncAzureBlobUploader(ObjectToStore("data.bin", "test", self.data), conn_str="fake")
+            await uploader.upload()
+            await uploader.close()
+            return uploader._container_client
+
+        self.assertTrue(asyncio.run(run()).closed)
+
+
+class TestAsyncAzureSecretsOffline(unittest.TestCase):
+    def setUp(self):
+        FakeAsyncSecretClient.vault.clear()
+        FakeAsyncSecretClient.vault.update({f"SECRET{index}": f"value{index}" for index in range(10)})
+        patcher = mock.patch.object(azaio, "SecretClient", FakeAsyncSecretClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_load(self):
+        async def run():
+            async with AsyncAzureSecrets("https://fake.vault.azure.net", credential=object()) as secrets:
+                await secrets.load()
+                return secrets
+
+        secrets = asyncio.run(run())
+        self.assertEqual(secrets.secrets, FakeAsyncSecretClient.vault)
+        self.assertEqual(secrets.SECRET3, "value3")
+        self.assertTrue(secrets._secret_client.closed)
+
+    def test_load_keys(self):
+        async def run():
+            async with AsyncAzureSecrets("https://fake.vault.azure.net", credential=object()) as secrets:
+                await secrets.load(["SECRET1", "SECRET2"])
+                return secrets.secrets
+
+        self.assertEqual(asyncio.run(run()), {"SECRET1": "value1", "SECRET2": "value2"})
+
+    def test_get_secret_fetches_once(self):
+        async def run():
+            async with AsyncAzureSecrets("https://fake.vault.azure.net", credential=object()) as secrets:
+                first = await secrets.get_secret("SECRET1")
+                FakeAsyncSecretClient.vault["SECRET1"] = "rotated"
+                return first, await secrets.get_secret("SECRET1")
+
+        self.assertEqual(asyncio.run(run()), ("value1", "value1"))
+
+    def test_set_secrets(self):
+        new = {f"NEW{index}": f"new{index}" for index in range(5)}
+
+        async def run():
+            async with AsyncAzureSecrets("https://fake.vault.azure.net", credential=object()) as secrets:
+                await secrets.set_secret("SECRET1", "changed")
+                await secrets.set_secrets(new)
+                return secrets
+
+        secrets = asyncio.run(run())
+        self.assertEqual(FakeAsyncSecretClient.vault["SECRET1"], "changed")
+        self.assertEqual({key: FakeAsyncSecretClient.vault[key] for key in new}, new)
+        self.assertEqual(secrets.NEW4, "new4")
+
+
+class TestAsyncKeyvaultOffline(unittest.TestCase):
+    def setUp(self):
+        settings = {
+            "AZURE_SUBSCRIPTION_ID": "subscription",
+            "AZURE_DEFAULT_GROUP_NAME": "group",
+            "AZURE_DEFAULT_LOCATION": "westeurope",
+            "AZURE_TENANT_ID": "00000000-0000-0000-0000-000000000000",
+            "AZURE_DEFAULT_OBJECT_ID": "00000000-0000-0000-0000-000000000001",
+        }
+        patcher = mock.patch.dict(os.environ, settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(azaio, "KeyVaultManagementClient", FakeAsyncKeyVaultManagementClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lifecycle(self):
+        async def run():
+            async with AsyncKeyvault("kv-test", credential=object()) as keyvault:
+                vaults = keyvault.keyvault_client.vaults.vaults
+                await keyvault.create()
+                created = await keyvault.keyvault()
+                await keyvault.delete()
+                return keyvault, created, dict(vaults)
+
+        keyvault, created, remaining = asyncio.run(run())
+        self.assertEqual(keyvault.keyvault_client.subscription_id, "subscription")
+        self.assertEqual(created["location"], "westeurope")
+        self.assertEqual(remaining, dict())
+        self.assertTrue(keyvault.keyvault_client.closed)
+
+
+@unittest.skipUnless(AZURITE_CONNECTION_STRING, "Azurite emulator not configured")
+class TestAsyncAzureBlobUploader(unittest.TestCase):
+    def setUp(self):
+        random_str = "".join(random.choices(string.ascii_lowercase, k=10))
+        self.container_name = f"test-{random_str}"
+        self.container = ContainerClient.from_connection_string(
+            conn_str=AZURITE_CONNECTION_STRING, container_name=self.container_name
+        )
+
+    def test_concurrent_uploads(self):
+        payloads = {f"data{i}.bin": os.urandom(100_000) for i in range(20)}
+
+        async def upload():
+            async with aiohttp.ClientSession() as session:
+                uploaders = [
+                    AsyncAzureBlobUploader(
+                        ObjectToStore(name, self.container_name, data),
+                        conn_str=AZURITE_CONNECTION_STRING,
+                        session=session,
+                    )
+                    for name, data in payloads.items()
+                ]
+                await asyncio.gather(*(u.upload_blocks(block_size=16 * 1024) for u in uploaders))
+                for uploader in uploaders:
+                    await uploader.close()
+
+        asyncio.run(upload())
+        for name, data in payloads.items():
+            blob = self.container.get_blob_client(name).download_blob().readall()
+            self.assertEqual(blob, data)
+
+    def tearDown(self):
+        self.container.delete_container()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+import azclients
+
+CONN_STR = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+
+
+class TestAzureClients(unittest.TestCase):
+    def setUp(self):
+        azclients.clear()
+
+    def test_container_client_is_reused(self):
+        client = azclients.container_client(CONN_STR, "container")
+        self.assertIs(client, azclients.container_client(CONN_STR, "container"))
+        self.assertIsNot(client, azclients.container_client(CONN_STR, "other"))
+
+    def test_registry_is_thread_safe(self):
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            clients = list(pool.map(lambda _: azclients.blob_service_client(CONN_STR), range(64)))
+        self.assertTrue(all(client is clients[0] for client in clients))
+
+    def test_shared_session(self):
+        self.assertIs(azclients.transport().session, azclients.http_session())
+
+    def test_session_per_pool_size(self):
+        session = azclients.http_session(4)
+        self.assertIs(session, azclients.http_session(4))
+        self.assertIs(azclients.transport(4).session, session)
+        self.assertIsNot(session, azclients.http_session())
+        self.assertEqual(session.get_adapter("https://").poolmanager.connection_pool_kw["maxsize"], 4)
+
+    def tearDown(self):
+        azclients.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
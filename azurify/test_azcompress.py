@@ -0,0 +1,33 @@
+import os
+import unittest
+
+from azcompress import CODECS, codec, compress, compress_iter
+
+
+def available_codecs():
+    for name in CODECS:
+        try:
+            yield codec(name)
+        except ImportError:
+            pass
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.data = b"".join(f"{i},order-{i},EUR,paid\n".encode() for i in range(100_000))
+
+    def test_frames_form_valid_stream(self):
+        for c in available_codecs():
+            with self.subTest(codec=c.name):
+                compressed = compress(self.data, c, frame_size=64 * 1024, max_workers=4)
+                self.assertLess(len(compressed), len(self.data))
+                self.assertEqual(c.decompress(compressed), self.data)
+
+    def test_compress_iter_keeps_order(self):
+        chunks = [os.urandom(1000) for _ in range(50)]
+        frames = list(compress_iter(iter(chunks), codec("gzip"), max_workers=3))
+        self.assertEqual([codec("gzip").decompress(frame) for frame in frames], chunks)
+
+
+if __name__ == "__main__":
+    unittest.main()
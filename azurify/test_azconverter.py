@@ -1,11 +1,31 @@
+import io
+import os
+import sys
+import subprocess
 import unittest
 
+from unittest import mock
+
+import pandas as pd
+
+import azconverter
 from azconverter import *
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
 
 class TestConverter(unittest.TestCase):
     def setUp(self):
-        pass
+        self.data = [{"createdAt": 2020 + i, "price": 10 * i} for i in range(5)]
 
     def test_converter_factory(self):
         cf = factory(output_type=Suffix.JSON.value)
@@ -14,10 +34,292 @@ class TestConverter(unittest.TestCase):
         self.assertIsInstance(cf, CSVConverter)
         cf = factory(output_type=Suffix.XLSX.value)
         self.assertIsInstance(cf, ExcelConverter)
+        cf = factory(output_type=Suffix.NDJSON.value)
+        self.assertIsInstance(cf, NDJSONConverter)
+
+    def test_factory_shares_instances(self):
+        self.assertIs(factory("csv"), factory("csv"))
+
+    def test_register(self):
+        class UpperCSVConverter(CSVConverter):
+            def convert(self, data, **options):
+                converted = super().convert(data, **options)
+                return ConvertedStream(suffix=converted.suffix, data=converted.data.upper())
+
+        self.addCleanup(azconverter._converters.pop, "upper", None)
+        register("upper", UpperCSVConverter)
+        self.assertIsInstance(factory("upper"), UpperCSVConverter)
+        self.assertEqual(factory("upper").convert(self.data).data, factory("csv").convert(self.data).data.upper())
+
+    def test_entry_point_plugins(self):
+        plugin = mock.Mock()
+        plugin.name = "plugin"
+        plugin.load.return_value = NDJSONConverter
+        broken = mock.Mock()
+        broken.name = "broken"
+        broken.load.side_effect = ImportError("missing dependency")
+        entry_points = mock.Mock()
+        entry_points.select.return_value = [plugin, broken]
+        self.addCleanup(azconverter._converters.pop, "plugin", None)
+        with mock.patch.object(azconverter, "_plugins_loaded", False), mock.patch.object(
+            azconverter, "entry_points", return_value=entry_points
+        ):
+            self.assertIsInstance(factory("plugin"), NDJSONConverter)
+            entry_points.select.assert_called_once_with(group=ENTRY_POINT_GROUP)
+            with self.assertRaises(KeyError):
+                factory("broken")
+
+    def test_memoized_convert(self):
+        cache = ConversionCache(max_entries=2)
+        with mock.patch.object(CSVConverter, "convert", wraps=factory("csv").convert) as csv_convert:
+            converted = convert("csv", self.data, cache=cache)
+            self.assertIs(convert("csv", [dict(record) for record in self.data], cache=cache), converted)
+            self.assertEqual(csv_convert.call_count, 1)
+            # different options or records are converted again
+            convert("csv", self.data, cache=cache, columns=["price"])
+            convert("csv", self.data[:2], cache=cache)
+            self.assertEqual(csv_convert.call_count, 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, sum(len(c.data) for c in cache._streams.values()))
+
+    def test_convert_caches_on_request(self):
+        with mock.patch.object(CSVConverter, "convert", wraps=factory("csv").convert) as csv_convert:
+            convert("csv", self.data)
+            convert("csv", self.data)
+            self.assertEqual(csv_convert.call_count, 2)
+        self.assertEqual(len(azconverter.conversions), 0)
+
+    def test_cache_of_replaced_converter(self):
+        cache = ConversionCache()
+        self.addCleanup(register, "csv", factory("csv"))
+        converted = convert("csv", self.data, cache=cache)
+        register("csv", NDJSONConverter)
+        self.assertEqual(convert("csv", self.data, cache=cache).suffix, Suffix.NDJSON)
+        self.assertEqual(converted.suffix, Suffix.CSV)
+
+    def test_cache_byte_budget(self):
+        cache = ConversionCache(max_bytes=10)
+        cache.put(("a",), ConvertedStream(suffix=Suffix.CSV, data=b"123456"))
+        cache.put(("b",), ConvertedStream(suffix=Suffix.CSV, data=b"123456"))
+        self.assertIsNone(cache.get(("a",)))
+        self.assertIsNotNone(cache.get(("b",)))
+        cache.put(("c",), ConvertedStream(suffix=Suffix.CSV, data=b"x" * 11))
+        self.assertIsNone(cache.get(("c",)))
+        self.assertEqual(cache.nbytes, 6)
+
+    def test_convert_iter(self):
+        # chunked conversion must produce the same bytes as a single convert
+        for suffix in [Suffix.CSV, Suffix.JSON, Suffix.NDJSON]:
+            converter = factory(output_type=suffix.value)
+            streamed = b"".join(converter.convert_iter(iter(self.data), chunk_rows=2))
+            self.assertEqual(streamed, converter.convert(self.data).data)
+
+    def test_python_engine(self):
+        # the python engine must produce the same bytes as pandas
+        data = [
+            {"id": i, "title": ["a/b", 'x "y", z', "grüße\n", ""][i % 4], "price": i / 3, "paid": i % 2 == 0, "note": None}
+            for i in range(10)
+        ]
+        # pandas writes the ints of a column with nulls, missing keys or floats as floats
+        for i, record in enumerate(data):
+            record["quantity"] = i if i % 4 else None
+            record["amount"] = i if i % 5 else i / 2
+            if i % 3:
+                record["discount"] = i
+            # pandas writes NaN as an empty CSV field and both as null in JSON
+            record["ratio"] = [float("nan"), float("inf"), -float("inf"), i / 7][i % 4]
+        for suffix in [Suffix.CSV, Suffix.JSON, Suffix.NDJSON]:
+            converter = factory(output_type=suffix.value)
+            for chunk_rows in [3, 100]:
+                self.assertEqual(
+                    b"".join(converter.convert_iter(iter(data), chunk_rows=chunk_rows, engine="python")),
+                    b"".join(converter.convert_iter(iter(data), chunk_rows=chunk_rows)),
+                )
+            self.assertEqual(
+                converter.convert(data, engine="python", columns=["price", "id"]).data,
+                converter.convert(data, columns=["price", "id"]).data,
+            )
+        with self.assertRaises(ValueError):
+            CSVConverter().convert(data, engine="unknown")
+
+    def test_convert_iter_empty(self):
+        self.assertEqual(b"".join(JSONConverter().convert_iter(iter([]))), b"[]")
+        self.assertEqual(b"".join(CSVConverter().convert_iter(iter([]))), b"")
+
+    def test_convert_parallel(self):
+        # shards encoded in worker processes must reassemble to the sequential output
+        data = [{"id": i, "title": f"a, {i}", **({"note": "x"} if i % 4 == 0 else {})} for i in range(25)]
+        for suffix in [Suffix.CSV, Suffix.JSON, Suffix.NDJSON]:
+            for engine in ["pandas", "python"]:
+                self.assertEqual(
+                    b"".join(convert_parallel(suffix, iter(data), chunk_rows=4, max_workers=2, engine=engine)),
+                    b"".join(factory(suffix).convert_iter(iter(data), chunk_rows=4, engine=engine)),
+                )
+        self.assertEqual(b"".join(convert_parallel(Suffix.JSON, iter([]))), b"[]")
+        with self.assertRaises(ValueError):
+            next(convert_parallel(Suffix.XLSX, iter(data)))
+
+    @unittest.skipUnless(pyarrow, "pyarrow not installed")
+    def test_parquet_row_groups(self):
+        converter = factory(output_type=Suffix.PARQUET.value)
+        streamed = b"".join(converter.convert_iter(iter(self.data), chunk_rows=2))
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(streamed))
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().to_pylist(), self.data)
+        converted = converter.convert(self.data)
+        self.assertEqual(converted.suffix, Suffix.PARQUET)
+        self.assertEqual(pyarrow.parquet.read_table(io.BytesIO(converted.data)).to_pylist(), self.data)
+
+    @unittest.skipUnless(pyarrow, "pyarrow not installed")
+    def test_record_batches_schema(self):
+        def read(rows):
+            streamed = b"".join(ParquetConverter().convert_iter(iter(rows), chunk_rows=2))
+            return pyarrow.parquet.read_table(io.BytesIO(streamed)).to_pylist()
+
+        # null columns hold back the batches until their type is known
+        rows = [{"a": 1, "b": None}, {"a": 2, "b": None}, {"a": 3, "b": 1.5}]
+        self.assertEqual(read(rows), rows)
+        rows = [{"b": None}, {"b": None}, {"b": 1}, {"b": 1.5}]
+        self.assertEqual(read(rows), rows)
+        # floats don't fit an int column once it's written
+        with self.assertRaisesRegex(ValueError, "`b`"):
+            read([{"b": 1}, {"b": 1}, {"b": 1.5}])
+        self.assertEqual(read([{"b": 1}, {"b": 1}, {"b": 2.0}]), [{"b": 1}, {"b": 1}, {"b": 2}])
+        with self.assertRaisesRegex(ValueError, "`c`"):
+            read([{"b": 1}, {"b": 1}, {"b": 2, "c": "x"}])
+        # missing columns are null
+        rows = [{"b": 1, "c": "x"}, {"b": 2}, {"b": 3}]
+        self.assertEqual(read(rows), [{"b": 1, "c": "x"}, {"b": 2, "c": None}, {"b": 3, "c": None}])
+
+    @unittest.skipUnless(pyarrow, "pyarrow not installed")
+    def test_arrow_record_batches(self):
+        batch = pyarrow.RecordBatch.from_pylist(self.data)
+        streamed = b"".join(ArrowConverter(compression="zstd").convert_iter(iter([batch, batch])))
+        table = pyarrow.ipc.open_file(io.BytesIO(streamed)).read_all()
+        self.assertEqual(table.to_pylist(), self.data + self.data)
+
+    def test_excel_sheets(self):
+        engines = ["openpyxl"] + (["xlsxwriter"] if xlsxwriter else [])
+        for engine in engines:
+            with self.subTest(engine=engine):
+                # 3 records per sheet below the header
+                converter = ExcelConverter(engine=engine, max_rows=4)
+                streamed = b"".join(converter.convert_iter(iter(self.data), chunk_rows=2))
+                sheets = pd.read_excel(io.BytesIO(streamed), sheet_name=None)
+                self.assertEqual(list(sheets), ["Sheet1", "Sheet2"])
+                self.assertEqual([len(sheet) for sheet in sheets.values()], [3, 2])
+                self.assertEqual(pd.concat(sheets.values()).to_dict("records"), self.data)
+        empty = pd.read_excel(io.BytesIO(ExcelConverter().convert([]).data))
+        self.assertTrue(empty.empty)
 
     def tearDown(self):
         pass
 
 
+class TestNormalize(unittest.TestCase):
+    def setUp(self):
+        self.orders = [
+            {
+                "id": 1000 + i,
+                "createdAt": f"2023-06-0{1 + i}T10:00:00Z",
+                "currencyCode": ["EUR", "USD"][i % 2],
+                "totalPriceSet": {"shopMoney": {"amount": "10.00", "currencyCode": "EUR"}},
+                "billingAddress": None if i == 0 else {"city": f"City {i}"},
+                "lineItems": [{"sku": f"S{i}", "quantity": 1}],
+            }
+            for i in range(6)
+        ]
+
+    def test_infer(self):
+        schema = Schema.infer(self.orders)
+        self.assertEqual(
+            schema.columns,
+            {
+                "id": DType.INT,
+                "createdAt": DType.DATETIME,
+                "currencyCode": DType.CATEGORY,
+                "totalPriceSet.shopMoney.amount": DType.CATEGORY,
+                "totalPriceSet.shopMoney.currencyCode": DType.CATEGORY,
+                "lineItems": DType.JSON,
+                "billingAddress.city": DType.STRING,
+            },
+        )
+
+    def test_normalize(self):
+        schema = Schema({"id": "Int64", "createdAt": "datetime", "currencyCode": "category", "missing": "Float64"})
+        df = normalize(self.orders[:2] + [{"id": None}], schema)
+        self.assertEqual(list(df.columns), ["id", "createdAt", "currencyCode", "missing"])
+        self.assertEqual([str(dtype) for dtype in df.dtypes], ["Int64", "datetime64[us, UTC]", "category", "Float64"])
+        self.assertTrue(df["id"].isna().iloc[2])
+        self.assertTrue(df["missing"].isna().all())
+
+    def test_convert_with_schema(self):
+        data = factory("csv").convert(self.orders[:2], schema=True).data.decode().splitlines()
+        self.assertEqual(data[0].split(",")[:4], ["id", "createdAt", "currencyCode", "totalPriceSet.shopMoney.amount"])
+        self.assertTrue(data[1].startswith("1000,2023-06-01T10:00:00Z,EUR,10.00,"))
+        self.assertIn('"[{""sku"":""S0"",""quantity"":1}]"', data[1])
+        chunks = list(factory("ndjson").convert_iter(self.orders, chunk_rows=4, schema=True))
+        self.assertEqual(len(chunks), 2)
+        self.assertIn(b'"billingAddress.city":"City 5"', chunks[1])
+        with self.assertRaises(ValueError):
+            factory("json").convert(self.orders, engine="python", schema=True)
+
+    def test_int_with_fractions(self):
+        # the schema inferred from the first chunk has an int column
+        rows = [{"b": 1}, {"b": 1}, {"b": 1.5}]
+        with self.assertLogs(level="WARNING"):
+            streamed = b"".join(factory("csv").convert_iter(rows, chunk_rows=2, schema=True))
+        self.assertEqual(streamed, b"b\n1\n1\n1.5\n")
+        if pyarrow is not None:
+            with self.assertRaisesRegex(ValueError, "schema"):
+                b"".join(ParquetConverter().convert_iter(rows, chunk_rows=2, schema=True))
+
+    @unittest.skipUnless(pyarrow, "requires pyarrow")
+    def test_parquet_with_schema(self):
+        data = b"".join(factory("parquet").convert_iter(self.orders, chunk_rows=4, schema=True))
+        table = pyarrow.parquet.read_table(io.BytesIO(data))
+        self.assertEqual(table.num_rows, len(self.orders))
+        self.assertTrue(pyarrow.types.is_dictionary(table.schema.field("currencyCode").type))
+        self.assertTrue(pyarrow.types.is_timestamp(table.schema.field("createdAt").type))
+
+
+class TestImports(unittest.TestCase):
+    """Importing a module has no side effects and doesn't pull in heavy dependencies"""
+
+    def modules_after(self, statement):
+        # fresh interpreter without any AZURE_* settings
+        env = {key: value for key, value in os.environ.items() if not key.startswith("AZURE_")}
+        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = f"import sys; {statement}; print(' '.join(sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        return set(result.stdout.split())
+
+    def test_converter_without_pandas(self):
+        modules = self.modules_after("import azurify.azconverter")
+        self.assertNotIn("pandas", modules)
+        self.assertFalse(any(name.startswith("azure") for name in modules))
+
+    def test_submodules_are_lazy(self):
+        modules = self.modules_after("import azurify")
+        self.assertNotIn("azurify.azconverter", modules)
+        modules = self.modules_after("import azurify; azurify.azcompress.codec('gzip')")
+        self.assertIn("azurify.azcompress", modules)
+        self.assertNotIn("azurify.azstorage", modules)
+        modules = self.modules_after("import azurify; azurify.azaio")
+        self.assertIn("azurify.azaio", modules)
+
+    def test_star_import_without_extras(self):
+        # None in sys.modules makes importing aiohttp fail like without the `aio` extra
+        modules = self.modules_after("sys.modules['aiohttp'] = None; from azurify import *")
+        self.assertIn("azurify.azstorage", modules)
+        self.assertNotIn("azurify.azaio", modules)
+
+    def test_keyvault_without_settings(self):
+        # neither settings nor clients are needed until they're used
+        modules = self.modules_after("import azurify.azkeyvault")
+        self.assertNotIn("azure.mgmt.keyvault", modules)
+        self.assertNotIn("azure.identity", modules)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,10 +1,25 @@
 # Testing creation and deletion of an azure keyvault
 
+import os
 import unittest
 import random
 import string
+import threading
 
-from azkeyvault import Keyvault, keyvault_client, generate_shopify_keyvault_name, shopify_store_name
+from types import SimpleNamespace
+from unittest import mock
+
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+
+from azurify import azsecrets
+from azkeyvault import (
+    Keyvault,
+    KeyvaultFleet,
+    keyvault_client,
+    generate_shopify_keyvault_name,
+    shopify_store_name,
+)
+from azurify.azsecrets import WriteStatus
 
 
 class TestAzureKeyvault(unittest.TestCase):
@@ -56,5 +71,126 @@ class TestAzureKeyvault(unittest.TestCase):
         pass
 
 
+class FakeVaults:
+    """In-memory replacement of the `vaults` operations of the management client.
+    The first create request is throttled and a vault is provisioned on the
+    second poll. Vaults of `fail` stores keep updating, the ones of `failed`
+    stores fail"""
+
+    def __init__(self, fail=(), failed=()):
+        self.fail = set(fail)
+        self.failed = set(failed)
+        self.polls = dict()
+        self.creates = []
+        self.running = 0
+        self.peak = 0
+        self._throttled = False
+        self._lock = threading.Lock()
+
+    def begin_create_or_update(self, group_name, kv_name, parameters, polling=True):
+        with self._lock:
+            if not self._throttled:
+                self._throttled = True
+                error = HttpResponseError(message="Too many requests")
+                error.status_code = 429
+                raise error
+            self.creates.append(kv_name)
+            self.polls[kv_name] = 0
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        return SimpleNamespace(result=lambda: None)
+
+    def get(self, group_name, kv_name):
+        with self._lock:
+            self.polls[kv_name] += 1
+            state = "Succeeded" if self.polls[kv_name] >= 2 else "Updating"
+            if any(kv_name.startswith(f"kv-{name}-") for name in self.fail):
+                state = "Updating"
+            if any(kv_name.startswith(f"kv-{name}-") for name in self.failed):
+                state = "Failed"
+            if state == "Succeeded":
+                self.running -= 1
+        properties = SimpleNamespace(provisioning_state=state, vault_uri=f"https://{kv_name}.vault.azure.net/")
+        return SimpleNamespace(name=kv_name, properties=properties)
+
+
+class FakeVaultSecretClient:
+    """In-memory replacement of `SecretClient` with a store per vault"""
+
+    vaults = dict()
+
+    def __init__(self, vault_url, credential, **kwargs):
+        self.vault = self.vaults.setdefault(vault_url, dict())
+
+    def list_properties_of_secrets(self):
+        return [SimpleNamespace(name=key, version=value, updated_on=None) for key, value in self.vault.items()]
+
+    def get_secret(self, name, version=None):
+        if name not in self.vault:
+            raise ResourceNotFoundError(f"Secret `{name}` not found")
+        return self._secret(name, self.vault[name])
+
+    def set_secret(self, name, value):
+        self.vault[name] = value
+        return self._secret(name, value)
+
+    @staticmethod
+    def _secret(name, value):
+        return SimpleNamespace(name=name, value=value, properties=SimpleNamespace(version=value, updated_on=None))
+
+
+class TestKeyvaultFleet(unittest.TestCase):
+    """Provision keyvaults of many stores against in-memory fakes"""
+
+    def setUp(self):
+        FakeVaultSecretClient.vaults.clear()
+        settings = {
+            "AZURE_DEFAULT_LOCATION": "westeurope",
+            "AZURE_TENANT_ID": "00000000-0000-0000-0000-000000000000",
+            "AZURE_DEFAULT_OBJECT_ID": "00000000-0000-0000-0000-000000000001",
+        }
+        patcher = mock.patch.dict(os.environ, settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(azsecrets, "SecretClient", FakeVaultSecretClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shop_urls = [f"store{index}.myshopify.com" for index in range(12)]
+
+    def fleet(self, vaults, **options):
+        client = SimpleNamespace(vaults=vaults)
+        return KeyvaultFleet(
+            keyvault_client=client, group_name="rg", credential=object(), poll_interval=0.001, **options
+        )
+
+    def test_provision(self):
+        vaults = FakeVaults()
+        secrets = {url: {"SHOPDOMAIN": url} for url in self.shop_urls}
+        results = self.fleet(vaults, max_concurrency=4).provision(self.shop_urls, secrets=secrets)
+
+        self.assertEqual([result.shop_url for result in results], self.shop_urls)
+        self.assertTrue(all(result.ok for result in results))
+        # every vault is created once, the throttled request was retried
+        self.assertEqual(len(vaults.creates), len(self.shop_urls))
+        self.assertLessEqual(vaults.peak, 4)
+        for result in results:
+            self.assertTrue(result.kv_name.startswith(f"kv-{result.shop_url.split('.')[0]}-"))
+            self.assertEqual(result.secrets["SHOPDOMAIN"].status, WriteStatus.CREATED)
+            self.assertEqual(FakeVaultSecretClient.vaults[result.vault_url], {"SHOPDOMAIN": result.shop_url})
+
+    def test_failures_dont_stop_the_fleet(self):
+        vaults = FakeVaults(fail=["store3"], failed=["store4"])
+        shop_urls = self.shop_urls[:5] + ["invalid_store.com"]
+        results = self.fleet(vaults, timeout=0.05).provision(shop_urls)
+
+        failed = {result.shop_url: result.error for result in results if not result.ok}
+        self.assertEqual(set(failed), {"store3.myshopify.com", "store4.myshopify.com", "invalid_store.com"})
+        self.assertIsInstance(failed["store3.myshopify.com"], TimeoutError)
+        self.assertIsInstance(failed["store4.myshopify.com"], RuntimeError)
+        self.assertIsInstance(failed["invalid_store.com"], ValueError)
+        # a failed vault isn't polled until the timeout
+        self.assertEqual([polls for name, polls in vaults.polls.items() if name.startswith("kv-store4-")], [1])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,197 @@
+# Testing partitioned exports. Tests talking to a storage account run against
+# the Azurite emulator, e.g.
+#   azurite-blob --silent &
+#   export AZURITE_CONNECTION_STRING="UseDevelopmentStorage=true"
+
+import io
+import re
+import json
+import os
+import random
+import string
+import threading
+import unittest
+
+from unittest import mock
+
+import pandas as pd
+
+from azure.storage.blob import ContainerClient
+
+import azpartition
+from azpartition import MANIFEST_NAME, NULL_PARTITION, PartitionedWriter, partition_path
+
+AZURITE_CONNECTION_STRING = os.environ.get("AZURITE_CONNECTION_STRING")
+
+
+class TestPartitionPath(unittest.TestCase):
+    def test_partition_path(self):
+        self.assertEqual(partition_path(["date", "currency"], ("2023-06-12", "EUR")), "date=2023-06-12/currency=EUR")
+        self.assertEqual(partition_path(["shop"], ("a/b=c",)), "shop=a%2Fb%3Dc")
+        self.assertEqual(partition_path(["date"], (None,)), f"date={NULL_PARTITION}")
+
+
+class FakeStorage:
+    """In-memory replacement of the uploader and the container client"""
+
+    def __init__(self):
+        self.blobs = dict()
+        self.deleted = []
+        self._lock = threading.Lock()
+
+    def uploader(self, object_to_store, conn_str):
+        storage = self
+
+        class Uploader:
+            def upload_blocks(self, **kwargs):
+                data = object_to_store.data_to_store
+                data = data if isinstance(data, bytes) else b"".join(data)
+                with storage._lock:
+                    storage.blobs[object_to_store.object_name] = data
+                return len(data)
+
+            upload = upload_blocks
+
+        return Uploader()
+
+    def container_client(self, conn_str, container_name):
+        return self
+
+    def delete_blob(self, name):
+        with self._lock:
+            del self.blobs[name]
+            self.deleted.append(name)
+
+
+class TestPartitionedWriterOffline(unittest.TestCase):
+    """Write datasets to in-memory storage"""
+
+    def setUp(self):
+        self.storage = FakeStorage()
+        for patcher in [
+            mock.patch.object(azpartition, "AzureBlobUploader", self.storage.uploader),
+            mock.patch.object(azpartition.azclients, "container_client", self.storage.container_client),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.rows = [{"id": i, "date": f"2023-06-{10 + i % 3}"} for i in range(600)]
+
+    def writer(self, **options):
+        return PartitionedWriter("conn", "exports", "orders", "csv", partition_by=["date"], **options)
+
+    def test_reruns_dont_mix(self):
+        writer = self.writer(part_size=1024, chunk_rows=50)
+        first = writer.write(iter(self.rows))
+        second = writer.write(iter(self.rows[:30]))
+        # a part of the first run is never overwritten by the second
+        names = {part.object_name for part in first.parts} | {part.object_name for part in second.parts}
+        self.assertEqual(len(names), len(first.parts) + len(second.parts))
+        for name in names:
+            self.assertRegex(name, r"^orders/date=2023-06-1\d/part-\d{5}-[0-9a-f]{32}\.csv$")
+        tokens = {re.search(r"-([0-9a-f]{32})\.", part.object_name).group(1) for part in second.parts}
+        self.assertEqual(len(tokens), 1)
+
+    def test_failed_write_deletes_committed_parts(self):
+        def rows():
+            yield from sorted(self.rows, key=lambda row: row["date"])
+            raise RuntimeError("connection lost")
+
+        with self.assertRaises(RuntimeError):
+            self.writer(chunk_rows=50, max_open_parts=1).write(rows())
+        # the parts of the first two dates were closed and committed before the rows failed
+        self.assertTrue(self.storage.deleted)
+        self.assertEqual(self.storage.blobs, {})
+
+
+@unittest.skipUnless(AZURITE_CONNECTION_STRING, "Azurite emulator not configured")
+class TestPartitionedWriter(unittest.TestCase):
+    def setUp(self):
+        random_str = "".join(random.choices(string.ascii_lowercase, k=10))
+        self.container_name = f"test-{random_str}"
+        self.container = ContainerClient.from_connection_string(
+            conn_str=AZURITE_CONNECTION_STRING, container_name=self.container_name
+        )
+        self.container.create_container()
+        self.rows = [
+            {"id": i, "date": f"2023-06-{10 + i % 3}", "email": f"customer{i}@example.com"} for i in range(600)
+        ]
+
+    def download(self, object_name):
+        return self.container.get_blob_client(object_name).download_blob().readall()
+
+    def test_write(self):
+        writer = PartitionedWriter(
+            AZURITE_CONNECTION_STRING,
+            self.container_name,
+            "orders",
+            "csv",
+            partition_by=["date"],
+            part_size=2048,
+            chunk_rows=50,
+            max_open_parts=3,
+        )
+        result = writer.write(iter(self.rows))
+
+        self.assertEqual(result.rows, len(self.rows))
+        self.assertGreater(len(result.parts), 3)
+        manifest = json.loads(self.download(f"orders/{MANIFEST_NAME}"))
+        self.assertEqual(manifest["rows"], len(self.rows))
+        self.assertEqual(len(manifest["parts"]), len(result.parts))
+
+        ids = []
+        for part in result.parts:
+            date = part.partition["date"]
+            self.assertTrue(part.object_name.startswith(f"orders/date={date}/part-"))
+            data = self.download(part.object_name)
+            self.assertEqual(len(data), part.size)
+            df = pd.read_csv(io.BytesIO(data))
+            # the partition value is only in the path
+            self.assertEqual(list(df.columns), ["id", "email"])
+            self.assertEqual(len(df), part.rows)
+            self.assertTrue(all(self.rows[i]["date"] == date for i in df["id"]))
+            ids.extend(df["id"])
+        self.assertEqual(sorted(ids), list(range(len(self.rows))))
+
+    def test_failed_part(self):
+        writer = PartitionedWriter(
+            AZURITE_CONNECTION_STRING, self.container_name, "orders", "unknown", partition_by=["date"]
+        )
+        with self.assertRaises(KeyError):
+            writer.write(iter(self.rows))
+        self.assertFalse(self.container.get_blob_client(f"orders/{MANIFEST_NAME}").exists())
+
+    def test_shared_schema(self):
+        rows = [dict(row, discount=5) if row["date"] == "2023-06-11" else row for row in self.rows]
+        writer = PartitionedWriter(
+            AZURITE_CONNECTION_STRING, self.container_name, "orders", "csv", partition_by=["date"], schema=True
+        )
+        result = writer.write(iter(rows))
+        # parts without discounts have the column too
+        for part in result.parts:
+            df = pd.read_csv(io.BytesIO(self.download(part.object_name)))
+            self.assertEqual(list(df.columns), ["id", "email", "discount"])
+
+    def test_failed_rows(self):
+        def rows():
+            yield from self.rows[:100]
+            raise RuntimeError("connection lost")
+
+        writer = PartitionedWriter(
+            AZURITE_CONNECTION_STRING, self.container_name, "orders", "csv", partition_by=["date"]
+        )
+        object_names = []
+        object_name = writer._object_name
+        writer._object_name = lambda values: object_names.append(object_name(values)) or object_names[-1]
+        with self.assertRaises(RuntimeError):
+            writer.write(rows())
+        # the open parts are incomplete and not committed
+        self.assertEqual(len(object_names), 3)
+        for name in object_names:
+            self.assertFalse(self.container.get_blob_client(name).exists())
+
+    def tearDown(self):
+        self.container.delete_container()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,11 +3,20 @@ import string
 import unittest
 import json
 import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
+from azure.core.exceptions import ResourceNotFoundError
 from azure.identity import DefaultAzureCredential
+from cryptography.fernet import Fernet
 
+import azsecrets
 from azkeyvault import Keyvault, keyvault_client
-from azsecrets import AzureSecrets
+from azsecrets import AzSecretKeys, AzureSecrets, WriteStatus
 
 
 class TestAzureSecrets(unittest.TestCase):
@@ -97,5 +106,168 @@ class TestAzureSecrets(unittest.TestCase):
         os.system("rm test_data*.json")
 
 
+class FakeSecretClient:
+    """In-memory replacement of `SecretClient` which counts the requests"""
+
+    vault = dict()
+
+    def __init__(self, vault_url, credential, **kwargs):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _log(self, *call):
+        with self._lock:
+            self.calls.append(call)
+
+    @staticmethod
+    def _version(value):
+        # a new value is a new version
+        return f"v-{value}"
+
+    def list_properties_of_secrets(self):
+        self._log("list")
+        return [
+            SimpleNamespace(name=key, version=self._version(value), updated_on=None)
+            for key, value in self.vault.items()
+        ]
+
+    def get_secret(self, name, version=None):
+        self._log("get", name)
+        if name not in self.vault:
+            raise ResourceNotFoundError(f"Secret `{name}` not found")
+        value = self.vault[name]
+        properties = SimpleNamespace(version=self._version(value), updated_on=None)
+        return SimpleNamespace(name=name, value=value, properties=properties)
+
+    def set_secret(self, name, value):
+        self._log("set", name)
+        self.vault[name] = value
+        properties = SimpleNamespace(version=self._version(value), updated_on=None)
+        return SimpleNamespace(name=name, value=value, properties=properties)
+
+
+class TestAzureSecretsOffline(unittest.TestCase):
+    """Test AzureSecrets against an in-memory vault"""
+
+    def setUp(self):
+        FakeSecretClient.vault = {f"SECRET{i}": str(i) for i in range(50)}
+        patcher = mock.patch.object(azsecrets, "SecretClient", FakeSecretClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def secrets(self, **kwargs):
+        return AzureSecrets(vault_url="https://kv-test.vault.azure.net/", credential=None, **kwargs)
+
+    def test_concurrent_load(self):
+        secrets = self.secrets(max_concurrency=8)
+        self.assertEqual(secrets.secrets, FakeSecretClient.vault)
+        self.assertEqual(secrets.SECRET42, "42")
+
+    def test_lazy(self):
+        secrets = self.secrets(lazy=True)
+        self.assertEqual(secrets._secret_client.calls, [])
+        # fetched on first access only
+        self.assertEqual(secrets.SECRET1, "1")
+        self.assertEqual(secrets.get_secret("SECRET1"), "1")
+        self.assertEqual(secrets._secret_client.calls, [("get", "SECRET1")])
+        self.assertEqual(secrets.secrets, {"SECRET1": "1"})
+
+    def test_lazy_allowed_and_prefetch_keys(self):
+        FakeSecretClient.vault.update({"SHOPDOMAIN": "mystore.myshopify.com", "APIVERSION": "2023-04"})
+        secrets = self.secrets(
+            lazy=True, allowed_keys=AzSecretKeys, prefetch_keys=[AzSecretKeys.SHOPDOMAIN]
+        )
+        self.assertEqual(secrets.secrets, {"SHOPDOMAIN": "mystore.myshopify.com"})
+        self.assertEqual(secrets.APIVERSION, "2023-04")
+        with self.assertRaises(AttributeError):
+            secrets.SECRET1
+        with self.assertRaises(KeyError):
+            secrets.get_secret("SECRET1")
+
+    def test_ttl_cache(self):
+        secrets = self.secrets(ttl=60)
+        self.assertEqual(secrets.SECRET1, "1")
+        self.assertEqual(secrets.cache_stats.hits, 1)
+
+        # rotate a secret and delete another one
+        FakeSecretClient.vault["SECRET1"] = "rotated"
+        del FakeSecretClient.vault["SECRET2"]
+        secrets._secret_client.calls.clear()
+        secrets.refresh()
+        self.assertEqual(secrets.SECRET1, "rotated")
+        self.assertNotIn("SECRET2", secrets.secrets)
+        # unchanged secrets aren't downloaded again
+        self.assertEqual(secrets._secret_client.calls, [("list",), ("get", "SECRET1")])
+        self.assertEqual(secrets.cache_stats.refreshes, 1)
+
+    def test_stale_while_revalidate(self):
+        secrets = self.secrets(ttl=0)
+        FakeSecretClient.vault["SECRET1"] = "rotated"
+        # the stale value is served while the cache is revalidated
+        self.assertEqual(secrets.get_secret("SECRET1"), "1")
+        for _ in range(100):
+            if secrets.cache_stats.revalidations:
+                break
+            time.sleep(0.01)
+        self.assertEqual(secrets.secrets["SECRET1"], "rotated")
+        self.assertEqual(secrets.cache_stats.stale_hits, 1)
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "secrets.snapshot")
+            key = Fernet.generate_key().decode()
+            with mock.patch.dict(os.environ, {"AZURIFY_SNAPSHOT_KEY": key}):
+                self.secrets(snapshot_path=path)
+                with open(path, "rb") as f:
+                    self.assertNotIn(b"SECRET1", f.read())
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+                FakeSecretClient.vault["SECRET1"] = "rotated"
+                secrets = self.secrets(snapshot_path=path)
+                # served from the snapshot until the versions are checked
+                self.assertEqual(secrets.secrets["SECRET2"], "2")
+                for _ in range(100):
+                    if secrets.cache_stats.revalidations:
+                        break
+                    time.sleep(0.01)
+                self.assertEqual(secrets.SECRET1, "rotated")
+                self.assertEqual(secrets._secret_client.calls, [("list",), ("get", "SECRET1")])
+
+    def test_concurrent_snapshots(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "secrets.snapshot")
+            key = Fernet.generate_key().decode()
+            secrets = self.secrets()
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda _: secrets.save_snapshot(path, key), range(64)))
+            self.assertEqual(os.listdir(tmp_dir), ["secrets.snapshot"])
+            self.assertTrue(secrets.load_snapshot(path, key))
+
+    def test_set_secrets(self):
+        secrets = self.secrets(lazy=True)
+        report = secrets.set_secrets({"SECRET1": "1", "SECRET2": "changed", "NEWKEY": "new"})
+        self.assertEqual(
+            {key: result.status for key, result in report.items()},
+            {
+                "SECRET1": WriteStatus.UNCHANGED,
+                "SECRET2": WriteStatus.UPDATED,
+                "NEWKEY": WriteStatus.CREATED,
+            },
+        )
+        # unchanged secrets don't get a new version
+        writes = [call for call in secrets._secret_client.calls if call[0] == "set"]
+        self.assertCountEqual(writes, [("set", "SECRET2"), ("set", "NEWKEY")])
+        self.assertEqual(secrets.NEWKEY, "new")
+
+    def test_set_secrets_rotated_behind_the_cache(self):
+        secrets = self.secrets()
+        # another writer rotates the cached secret
+        FakeSecretClient.vault["SECRET1"] = "rotated"
+        report = secrets.set_secrets({"SECRET1": "1", "SECRET2": "2"})
+        self.assertEqual(report["SECRET1"].status, WriteStatus.UPDATED)
+        self.assertEqual(report["SECRET2"].status, WriteStatus.UNCHANGED)
+        self.assertEqual(FakeSecretClient.vault["SECRET1"], "1")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,406 @@
+# Testing block based uploads. Tests talking to a storage account run against
+# the Azurite emulator, e.g.
+#   azurite-blob --silent &
+#   export AZURITE_CONNECTION_STRING="UseDevelopmentStorage=true"
+
+import io
+import gzip
+import mmap
+import os
+import pathlib
+import random
+import string
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core.exceptions import HttpResponseError, ResourceExistsError
+from azure.storage.blob import BlobClient, ContainerClient
+
+import azstorage
+from azconverter import factory
+from azstorage import (
+    AzureBlobUploader,
+    BatchBlobUploader,
+    ObjectToStore,
+    UploadManifest,
+    UploadResult,
+    UploadSummary,
+    block_id,
+    data_view,
+    ensure_container,
+    file_blocks,
+    known_containers,
+    export,
+    rebuffer,
+    split_blocks,
+)
+
+AZURITE_CONNECTION_STRING = os.environ.get("AZURITE_CONNECTION_STRING")
+
+
+class TestIncremental(unittest.TestCase):
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "manifest.json")
+            manifest = UploadManifest(path)
+            self.assertIsNone(manifest.get("exports", "data.csv"))
+            manifest.update("exports", "data.csv", "abc")
+            manifest.save()
+            self.assertEqual(UploadManifest(path).get("exports", "data.csv"), "abc")
+
+    def test_manifest_concurrent_saves(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "manifest.json")
+            manifests = [UploadManifest(path) for _ in range(8)]
+            for index, manifest in enumerate(manifests):
+                manifest.update("exports", "data.csv", str(index))
+            # the instances of separate runs don't share a lock
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda index: manifests[index % 8].save(), range(64)))
+            self.assertEqual(os.listdir(tmp_dir), ["manifest.json"])
+            self.assertIsNotNone(UploadManifest(path).get("exports", "data.csv"))
+
+    def test_summary(self):
+        results = [
+            UploadResult("a", "c", size=10),
+            UploadResult("b", "c", size=20, skipped=True),
+            UploadResult("c", "c", error=ValueError()),
+        ]
+        self.assertEqual(
+            UploadSummary.from_results(results),
+            UploadSummary(uploaded=1, skipped=1, failed=1, uploaded_bytes=10, skipped_bytes=20),
+        )
+
+
+class TestBlocks(unittest.TestCase):
+    def test_block_id(self):
+        # block ids of a blob must have equal length
+        self.assertEqual(len(block_id(0)), len(block_id(99_999)))
+        self.assertNotEqual(block_id(1), block_id(2))
+
+    def test_split_blocks(self):
+        data = os.urandom(1000)
+        blocks = list(split_blocks(data, 300))
+        self.assertEqual([len(block) for block in blocks], [300, 300, 300, 100])
+        self.assertEqual(b"".join(blocks), data)
+        self.assertEqual(list(split_blocks(b"", 300)), [])
+
+    def test_rebuffer(self):
+        chunks = [b"a" * 70, b"b" * 500, b"c" * 10, b"d" * 20]
+        blocks = list(rebuffer(iter(chunks), 200))
+        self.assertEqual([len(block) for block in blocks], [200, 200, 200])
+        self.assertEqual(b"".join(blocks), b"".join(chunks))
+        self.assertEqual(list(rebuffer(iter([]), 200)), [])
+
+
+class TestLocalFiles(unittest.TestCase):
+    def test_file_blocks(self):
+        data = os.urandom(100_000)
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            # the file position isn't used
+            self.assertEqual(b"".join(file_blocks(f, 30_000)), data)
+            self.assertEqual([len(block) for block in file_blocks(f, 30_000)], [30_000] * 3 + [10_000])
+            # seek and read where there's no os.pread, e.g. on Windows
+            position = f.tell()
+            with mock.patch.object(azstorage, "_pread", None):
+                self.assertEqual(b"".join(file_blocks(f, 30_000)), data)
+            self.assertEqual(f.tell(), position)
+
+    def test_data_view(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b"0123456789")
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with data_view(memoryview(mapped)[2:5]) as view:
+                    self.assertEqual(view.tobytes(), b"234")
+
+
+class TestContainerCache(unittest.TestCase):
+    def setUp(self):
+        known_containers.clear()
+
+    def test_ensure_container_once(self):
+        container = mock.Mock(account_name="account", container_name="container")
+        for _ in range(1000):
+            ensure_container(container)
+        container.create_container.assert_called_once()
+        self.assertIn(container, known_containers)
+
+    def test_container_already_exists(self):
+        container = mock.Mock(account_name="account", container_name="container")
+        container.create_container.side_effect = ResourceExistsError("ContainerAlreadyExists")
+        ensure_container(container)
+        self.assertIn(container, known_containers)
+
+    def test_may_not_create_container(self):
+        # e.g. a container SAS or the role Storage Blob Data Contributor
+        error = HttpResponseError("AuthorizationFailure")
+        error.status_code = 403
+        container = mock.Mock(account_name="account", container_name="container")
+        container.create_container.side_effect = error
+        container.exists.return_value = True
+        ensure_container(container)
+        self.assertIn(container, known_containers)
+
+        known_containers.clear()
+        container.exists.return_value = False
+        with self.assertRaises(HttpResponseError):
+            ensure_container(container)
+        self.assertNotIn(container, known_containers)
+
+    def tearDown(self):
+        known_containers.clear()
+
+
+@unittest.skipUnless(AZURITE_CONNECTION_STRING, "Azurite emulator not configured")
+class TestAzureBlobUploader(unittest.TestCase):
+    def setUp(self):
+        random_str = "".join(random.choices(string.ascii_lowercase, k=10))
+        self.container_name = f"test-{random_str}"
+        self.container = ContainerClient.from_connection_string(
+            conn_str=AZURITE_CONNECTION_STRING, container_name=self.container_name
+        )
+        self.container.create_container()
+
+    def download(self, object_name):
+        return self.container.get_blob_client(object_name).download_blob().readall()
+
+    def test_upload_blocks(self):
+        data = os.urandom(1024 * 1024 + 17)
+        object_to_store = ObjectToStore(
+            object_name="data.bin", container_name=self.container_name, data_to_store=data
+        )
+        AzureBlobUploader(
+            object_to_store=object_to_store, conn_str=AZURITE_CONNECTION_STRING
+        ).upload_blocks(block_size=64 * 1024, max_concurrency=8)
+        self.assertEqual(self.download("data.bin"), data)
+
+    def test_upload_chunks(self):
+        chunks = [os.urandom(random.randint(1, 50_000)) for _ in range(40)]
+        object_to_store = ObjectToStore(
+            object_name="chunks.bin", container_name=self.container_name, data_to_store=iter(chunks)
+        )
+        size = AzureBlobUploader(
+            object_to_store=object_to_store, conn_str=AZURITE_CONNECTION_STRING
+        ).upload_blocks(block_size=64 * 1024, max_concurrency=2)
+        self.assertEqual(size, sum(len(chunk) for chunk in chunks))
+        self.assertEqual(self.download("chunks.bin"), b"".join(chunks))
+
+    def test_upload_iterable(self):
+        chunks = [b"a" * 1000, b"b" * 10, b"c"]
+        size = AzureBlobUploader(
+            object_to_store=ObjectToStore("chunks.bin", self.container_name, iter(chunks)),
+            conn_str=AZURITE_CONNECTION_STRING,
+        ).upload()
+        self.assertEqual(size, 1011)
+        self.assertEqual(self.download("chunks.bin"), b"".join(chunks))
+
+    def test_export(self):
+        rows = [{"id": i, "price": i * 10} for i in range(10_000)]
+        result = export(
+            rows=iter(rows),
+            suffix="csv",
+            container_name=self.container_name,
+            object_name="data.csv",
+            conn_str=AZURITE_CONNECTION_STRING,
+            chunk_rows=1000,
+            block_size=16 * 1024,
+        )
+        expected = factory("csv").convert(rows).data
+        self.assertEqual(result.size, len(expected))
+        self.assertEqual(self.download("data.csv"), expected)
+
+    def test_export_parallel(self):
+        rows = [{"id": i, "price": i * 10} for i in range(10_000)]
+        result = export(
+            rows=iter(rows),
+            suffix="json",
+            container_name=self.container_name,
+            object_name="data.json",
+            conn_str=AZURITE_CONNECTION_STRING,
+            chunk_rows=1000,
+            max_workers=2,
+        )
+        expected = factory("json").convert(rows).data
+        self.assertEqual(result.size, len(expected))
+        self.assertEqual(self.download("data.json"), expected)
+
+    def test_export_compressed(self):
+        rows = [{"id": i, "price": i * 10} for i in range(10_000)]
+        result = export(
+            rows=iter(rows),
+            suffix="csv",
+            container_name=self.container_name,
+            object_name="data.csv",
+            conn_str=AZURITE_CONNECTION_STRING,
+            codec="gzip",
+        )
+        self.assertEqual(result.object_name, "data.csv.gz")
+        blob_client = self.container.get_blob_client("data.csv.gz")
+        content_settings = blob_client.get_blob_properties().content_settings
+        self.assertEqual(content_settings.content_encoding, "gzip")
+        self.assertEqual(content_settings.content_type, "text/csv")
+        data = blob_client.download_blob(decompress=False).readall()
+        self.assertEqual(gzip.decompress(data), factory("csv").convert(rows).data)
+
+    def test_deleted_container_is_recreated(self):
+        uploader = AzureBlobUploader(
+            object_to_store=ObjectToStore("data.bin", self.container_name, b"data"),
+            conn_str=AZURITE_CONNECTION_STRING,
+        )
+        uploader.upload()
+        # the cached container is gone, the upload creates it again
+        self.container.delete_container()
+        uploader.upload()
+        self.assertEqual(self.download("data.bin"), b"data")
+        # the retry sends a stream from its start again
+        uploader = AzureBlobUploader(
+            object_to_store=ObjectToStore("stream.bin", self.container_name, io.BytesIO(b"stream")),
+            conn_str=AZURITE_CONNECTION_STRING,
+        )
+        self.container.delete_container()
+        uploader.upload()
+        self.assertEqual(self.download("stream.bin"), b"stream")
+
+    def test_upload_many(self):
+        payloads = {f"data{i}.bin": os.urandom(10_000) for i in range(10)}
+        objects = [ObjectToStore(name, self.container_name, data) for name, data in payloads.items()]
+        # an object in an invalid container fails without stopping the batch
+        objects.append(ObjectToStore("data.bin", "Invalid_Container", b"data"))
+        results = BatchBlobUploader(
+            conn_str=AZURITE_CONNECTION_STRING, max_concurrency=4
+        ).upload_many(objects)
+        self.assertEqual([result.ok for result in results], [True] * 10 + [False])
+        self.assertEqual(results[0].size, 10_000)
+        for name, data in payloads.items():
+            self.assertEqual(self.download(name), data)
+
+    def test_skip_unchanged(self):
+        def upload(data, method):
+            uploader = AzureBlobUploader(
+                object_to_store=ObjectToStore("data.bin", self.container_name, data),
+                conn_str=AZURITE_CONNECTION_STRING,
+            )
+            getattr(uploader, method)(skip_unchanged=True)
+            return uploader.skipped
+
+        for method in ["upload", "upload_blocks"]:
+            self.assertFalse(upload(b"data", method))
+            self.assertTrue(upload(b"data", method))
+            self.assertFalse(upload(b"changed", method))
+            self.assertEqual(self.download("data.bin"), b"changed")
+            self.container.delete_blob("data.bin")
+
+    def test_export_skip_unchanged(self):
+        rows = [{"id": i, "price": i * 10} for i in range(1000)]
+        kwargs = dict(
+            suffix="csv",
+            container_name=self.container_name,
+            object_name="data.csv",
+            conn_str=AZURITE_CONNECTION_STRING,
+            skip_unchanged=True,
+        )
+        self.assertFalse(export(rows=iter(rows), **kwargs).skipped)
+        result = export(rows=iter(rows), **kwargs)
+        self.assertTrue(result.skipped)
+        self.assertEqual(result.size, len(factory("csv").convert(rows).data))
+        self.assertFalse(export(rows=iter(rows[1:]), **kwargs).skipped)
+        self.assertEqual(self.download("data.csv"), factory("csv").convert(rows[1:]).data)
+
+    def test_upload_many_with_manifest(self):
+        objects = [ObjectToStore(f"data{i}.bin", self.container_name, os.urandom(100)) for i in range(5)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest = UploadManifest(os.path.join(tmp_dir, "manifest.json"))
+            uploader = BatchBlobUploader(
+                conn_str=AZURITE_CONNECTION_STRING, skip_unchanged=True, manifest=manifest
+            )
+            uploader.upload_many(objects)
+            objects[0].data_to_store = b"changed"
+            results = uploader.upload_many(objects)
+            summary = UploadSummary.from_results(results)
+            self.assertEqual((summary.uploaded, summary.skipped, summary.skipped_bytes), (1, 4, 400))
+            self.assertEqual(self.download("data0.bin"), b"changed")
+
+    def test_upload_file(self):
+        data = os.urandom(300_000)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir, "data.bin")
+            with open(path, "wb") as f:
+                f.write(data)
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                sources = {
+                    "path.bin": path,
+                    "file.bin": f,
+                    "mmap.bin": mapped,
+                    "region.bin": memoryview(mapped)[1000:2000],
+                }
+                for name, source in sources.items():
+                    size = AzureBlobUploader(
+                        object_to_store=ObjectToStore(name, self.container_name, source),
+                        conn_str=AZURITE_CONNECTION_STRING,
+                    ).upload_blocks(
+                        block_size=64 * 1024,
+                        max_concurrency=4,
+                        journal_path=os.path.join(tmp_dir, "journal"),
+                    )
+                    self.assertEqual(self.download(name), data[1000:2000] if name == "region.bin" else data)
+                    self.assertEqual(size, len(self.download(name)))
+                sources["region.bin"].release()
+            # upload() falls back to blocks for files
+            AzureBlobUploader(
+                object_to_store=ObjectToStore("upload.bin", self.container_name, path),
+                conn_str=AZURITE_CONNECTION_STRING,
+            ).upload()
+        self.assertEqual(self.download("upload.bin"), data)
+
+    def test_upload_text(self):
+        # a str is content like the output of `DataFrame.to_csv()`, not a path
+        for name, upload in [("upload.csv", "upload"), ("blocks.csv", "upload_blocks")]:
+            uploader = AzureBlobUploader(
+                object_to_store=ObjectToStore(name, self.container_name, "id,title\n1,grüße\n"),
+                conn_str=AZURITE_CONNECTION_STRING,
+            )
+            self.assertEqual(getattr(uploader, upload)(), len("id,title\n1,grüße\n".encode()))
+            self.assertEqual(self.download(name), "id,title\n1,grüße\n".encode())
+
+    def test_resume_interrupted_upload(self):
+        chunks = [os.urandom(16 * 1024) for _ in range(20)]
+
+        def interrupted():
+            yield from chunks[:12]
+            raise ConnectionError("upload killed")
+
+        def uploader(data):
+            return AzureBlobUploader(
+                object_to_store=ObjectToStore("data.bin", self.container_name, data),
+                conn_str=AZURITE_CONNECTION_STRING,
+            )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal_path = os.path.join(tmp_dir, "data.bin.journal")
+            with self.assertRaises(ConnectionError):
+                uploader(interrupted()).upload_blocks(
+                    block_size=32 * 1024, max_concurrency=2, journal_path=journal_path
+                )
+            self.assertTrue(os.path.exists(journal_path))
+            with mock.patch.object(
+                BlobClient, "stage_block", autospec=True, side_effect=BlobClient.stage_block
+            ) as stage_block:
+                size = uploader(iter(chunks)).upload_blocks(
+                    block_size=32 * 1024, max_concurrency=2, journal_path=journal_path
+                )
+            # the 6 blocks staged before the interruption aren't sent again
+            self.assertEqual(stage_block.call_count, 4)
+            self.assertFalse(os.path.exists(journal_path))
+        self.assertEqual(size, 20 * 16 * 1024)
+        self.assertEqual(self.download("data.bin"), b"".join(chunks))
+
+    def tearDown(self):
+        self.container.delete_container()
+
+
+if __name__ == "__main__":
+    unittest.main()
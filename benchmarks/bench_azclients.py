@@ -0,0 +1,44 @@
+"""Per-upload latency with a new `ContainerClient` per upload compared to the
+client registry, which keeps connections alive between uploads.
+
+    export AZURITE_CONNECTION_STRING="UseDevelopmentStorage=true"
+    python benchmarks/bench_azclients.py
+"""
+import os
+import time
+
+from azure.storage.blob import ContainerClient
+
+from azurify import azclients
+
+CONTAINER_NAME = "benchmark"
+UPLOADS = 200
+PAYLOAD = os.urandom(16 * 1024)
+
+
+def fresh_client(conn_str):
+    return ContainerClient.from_connection_string(conn_str=conn_str, container_name=CONTAINER_NAME)
+
+
+def registry_client(conn_str):
+    return azclients.container_client(conn_str, CONTAINER_NAME)
+
+
+def main():
+    conn_str = os.environ.get("AZURITE_CONNECTION_STRING", "UseDevelopmentStorage=true")
+    container = registry_client(conn_str)
+    if not container.exists():
+        container.create_container()
+
+    for name, client in [("new client per upload", fresh_client), ("client registry", registry_client)]:
+        start = time.perf_counter()
+        for i in range(UPLOADS):
+            client(conn_str).get_blob_client(f"blob-{i}").upload_blob(PAYLOAD, overwrite=True)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24} {elapsed / UPLOADS * 1000:7.2f} ms/upload")
+
+    container.delete_container()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Compression ratio and throughput per codec, single-threaded and on all cores.
+
+    pip install zstandard lz4
+    python benchmarks/bench_azcompress.py
+"""
+import os
+import time
+
+from azurify.azcompress import CODECS, codec, compress
+from azurify.azconverter import factory
+
+ROWS = 500_000
+
+
+def orders():
+    for i in range(ROWS):
+        yield {
+            "id": 5_000_000 + i,
+            "createdAt": f"2023-06-{1 + i % 28:02d}T10:{i % 60:02d}:00Z",
+            "currency": ["EUR", "USD", "CHF"][i % 3],
+            "financialStatus": ["PAID", "PENDING", "REFUNDED"][i % 3],
+            "totalPrice": round(10 + i % 500 * 0.37, 2),
+            "email": f"customer{i % 20_000}@example.com",
+        }
+
+
+def main():
+    data = b"".join(factory("csv").convert_iter(orders()))
+    print(f"{len(data) / 2**20:.1f} MiB CSV, {os.cpu_count()} CPUs")
+    for name in CODECS:
+        for level in {"gzip": [1, 6], "zstd": [1, 3, 9], "lz4": [0, 9]}[name]:
+            try:
+                c = codec(name, level=level)
+            except ImportError as error:
+                print(f"{name:<5} skipped: {error}")
+                break
+            for max_workers in [1, None]:
+                start = time.perf_counter()
+                compressed = compress(data, c, max_workers=max_workers)
+                elapsed = time.perf_counter() - start
+                workers = max_workers or os.cpu_count()
+                print(
+                    f"{name:<5} level {level:<2} x{workers:<3} ratio {len(data) / len(compressed):5.1f}  "
+                    f"{len(data) / elapsed / 2**20:8.1f} MiB/s"
+                )
+
+
+if __name__ == "__main__":
+    main()
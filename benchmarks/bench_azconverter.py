@@ -0,0 +1,155 @@
+"""Rows per second of the pandas and python engines, size, write and read time
+of the columnar formats compared with CSV, memory and encode time of nested
+records with and without normalization, rows per second and peak RSS of the
+streaming Excel writers compared with `DataFrame.to_excel`, and rows per second
+of `convert_parallel` by number of worker processes.
+
+    pip install pyarrow xlsxwriter
+    python benchmarks/bench_azconverter.py
+"""
+import io
+import os
+import time
+import resource
+import multiprocessing
+
+import pandas as pd
+
+from azurify.azconverter import (
+    ArrowConverter,
+    ExcelConverter,
+    ParquetConverter,
+    Schema,
+    convert_parallel,
+    factory,
+    normalize,
+)
+
+ROWS = 500_000
+EXCEL_ROWS = 200_000
+
+
+def orders():
+    for i in range(ROWS):
+        yield {
+            "id": 5_000_000 + i,
+            "createdAt": f"2023-06-{1 + i % 28:02d}T10:{i % 60:02d}:00Z",
+            "currency": ["EUR", "USD", "CHF"][i % 3],
+            "financialStatus": ["PAID", "PENDING", "REFUNDED"][i % 3],
+            "totalPrice": round(10 + i % 500 * 0.37, 2),
+            "email": f"customer{i % 20_000}@example.com",
+        }
+
+
+def nested_orders():
+    for order in orders():
+        i = order["id"]
+        yield {
+            **order,
+            "totalPriceSet": {"shopMoney": {"amount": f"{order['totalPrice']:.2f}", "currencyCode": order["currency"]}},
+            "shippingAddress": {"city": ["Berlin", "Zurich", "Vienna"][i % 3], "countryCode": ["DE", "CH", "AT"][i % 3]},
+            "lineItems": [{"sku": f"SKU-{i % 300}", "quantity": 1 + i % 3}],
+        }
+
+
+def engines():
+    # created up front, so only the encoding is measured
+    rows = list(orders())
+    for suffix in ["csv", "json", "ndjson"]:
+        for engine in ["pandas", "python"]:
+            start = time.perf_counter()
+            for _ in factory(suffix).convert_iter(rows, engine=engine):
+                pass
+            elapsed = time.perf_counter() - start
+            print(f"{suffix:<6} {engine:<6} {ROWS / elapsed:10,.0f} rows/s")
+
+
+def columnar():
+    converters = {
+        "csv": (factory("csv"), pd.read_csv),
+        "parquet snappy": (ParquetConverter(), pd.read_parquet),
+        "parquet zstd": (ParquetConverter(compression="zstd"), pd.read_parquet),
+        "arrow lz4": (ArrowConverter(), pd.read_feather),
+    }
+    for name, (converter, read) in converters.items():
+        start = time.perf_counter()
+        data = b"".join(converter.convert_iter(orders()))
+        written = time.perf_counter() - start
+        start = time.perf_counter()
+        df = read(io.BytesIO(data))
+        loaded = time.perf_counter() - start
+        assert len(df) == ROWS
+        print(
+            f"{name:<15} {len(data) / 2**20:7.1f} MiB  write {ROWS / written:10,.0f} rows/s  "
+            f"read {loaded:6.3f}s"
+        )
+
+
+def normalization():
+    rows = list(nested_orders())
+    schema = Schema.infer(rows)
+    frames = {"raw": pd.DataFrame(rows), "normalized": normalize(rows, schema)}
+    for name, df in frames.items():
+        print(f"{name:<10} {df.memory_usage(deep=True).sum() / 2**20:7.1f} MiB in memory")
+    for suffix in ["csv", "ndjson", "parquet"]:
+        for name, options in {"raw": {}, "normalized": {"schema": schema}}.items():
+            start = time.perf_counter()
+            size = sum(map(len, factory(suffix).convert_iter(rows, **options)))
+            elapsed = time.perf_counter() - start
+            print(f"{suffix:<8} {name:<10} {size / 2**20:7.1f} MiB  {ROWS / elapsed:10,.0f} rows/s")
+
+
+def _to_excel(engine, queue):
+    # runs in its own process, so the peak RSS is the one of this writer only
+    rows = (order for _, order in zip(range(EXCEL_ROWS), orders()))
+    start = time.perf_counter()
+    if engine == "pandas":
+        writer = io.BytesIO()
+        pd.DataFrame(list(rows)).to_excel(writer, index=False)
+        size = len(writer.getvalue())
+    else:
+        size = sum(map(len, ExcelConverter(engine=engine).convert_iter(rows)))
+    elapsed = time.perf_counter() - start
+    queue.put((size, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def excel():
+    for engine in ["pandas", "xlsxwriter", "openpyxl"]:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_to_excel, args=(engine, queue))
+        process.start()
+        try:
+            size, elapsed, peak = queue.get()
+        finally:
+            process.join()
+        print(
+            f"xlsx {engine:<10} {size / 2**20:7.1f} MiB  {EXCEL_ROWS / elapsed:10,.0f} rows/s  "
+            f"peak RSS {peak / 1024:7.1f} MiB"
+        )
+
+
+def parallel():
+    rows = list(orders())
+    workers = sorted({1, 2, os.cpu_count() or 1})
+    for suffix in ["csv", "json"]:
+        start = time.perf_counter()
+        for _ in factory(suffix).convert_iter(rows):
+            pass
+        print(f"{suffix:<6} sequential  {ROWS / (time.perf_counter() - start):10,.0f} rows/s")
+        for max_workers in workers:
+            start = time.perf_counter()
+            for _ in convert_parallel(suffix, rows, max_workers=max_workers):
+                pass
+            print(f"{suffix:<6} {max_workers:2d} workers  {ROWS / (time.perf_counter() - start):10,.0f} rows/s")
+
+
+def main():
+    engines()
+    columnar()
+    normalization()
+    excel()
+    parallel()
+
+
+if __name__ == "__main__":
+    main()
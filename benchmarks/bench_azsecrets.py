@@ -0,0 +1,56 @@
+"""Startup time of `AzureSecrets` for vaults of different sizes.
+
+Key Vault only talks TLS with challenge based authentication, so instead of a
+server the benchmark replaces the `SecretClient` by a fake vault which adds a
+fixed latency to every call, like a round trip to Azure would.
+
+    python benchmarks/bench_azsecrets.py
+"""
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from azurify import azsecrets
+
+LATENCY = 0.02
+
+
+class FakeSecretClient:
+    """In-memory vault with `LATENCY` seconds per request"""
+
+    secrets = dict()
+
+    def __init__(self, vault_url, credential, **kwargs):
+        self.vault_url = vault_url
+
+    def list_properties_of_secrets(self):
+        time.sleep(LATENCY)
+        return [SimpleNamespace(name=key, version="1") for key in self.secrets]
+
+    def get_secret(self, name, version=None):
+        time.sleep(LATENCY)
+        return SimpleNamespace(name=name, value=self.secrets[name])
+
+    def set_secret(self, name, value):
+        time.sleep(LATENCY)
+        self.secrets[name] = value
+        return SimpleNamespace(name=name, value=value)
+
+
+def main():
+    with mock.patch.object(azsecrets, "SecretClient", FakeSecretClient):
+        for vault_size in [5, 50, 500]:
+            FakeSecretClient.secrets = {f"SECRET{i}": str(i) for i in range(vault_size)}
+            for max_concurrency in [1, 16, 64]:
+                start = time.perf_counter()
+                azsecrets.AzureSecrets(
+                    vault_url="https://kv-benchmark.vault.azure.net/",
+                    credential=None,
+                    max_concurrency=max_concurrency,
+                )
+                elapsed = time.perf_counter() - start
+                print(f"{vault_size:>4} secrets, max_concurrency={max_concurrency:<3} {elapsed:7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
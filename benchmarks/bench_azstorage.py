@@ -0,0 +1,52 @@
+"""Throughput of block based uploads depending on the number of parallel blocks.
+
+Runs against the Azurite emulator (or any storage account):
+
+    azurite-blob --silent &
+    export AZURITE_CONNECTION_STRING="UseDevelopmentStorage=true"
+    python benchmarks/bench_azstorage.py
+"""
+import os
+import time
+
+from azure.storage.blob import ContainerClient
+
+from azurify.azstorage import AzureBlobUploader, ObjectToStore
+
+CONTAINER_NAME = "benchmark"
+PAYLOAD_SIZE = 64 * 1024 * 1024
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def main():
+    conn_str = os.environ.get("AZURITE_CONNECTION_STRING", "UseDevelopmentStorage=true")
+    container = ContainerClient.from_connection_string(
+        conn_str=conn_str, container_name=CONTAINER_NAME
+    )
+    if not container.exists():
+        container.create_container()
+
+    data = os.urandom(PAYLOAD_SIZE)
+    object_to_store = ObjectToStore(
+        object_name="payload.bin", container_name=CONTAINER_NAME, data_to_store=data
+    )
+    uploader = AzureBlobUploader(object_to_store=object_to_store, conn_str=conn_str)
+
+    start = time.perf_counter()
+    uploader.upload()
+    elapsed = time.perf_counter() - start
+    print(f"upload_blob               {PAYLOAD_SIZE / elapsed / 2**20:8.1f} MiB/s")
+
+    for max_concurrency in [1, 2, 4, 8, 16]:
+        start = time.perf_counter()
+        uploader.upload_blocks(block_size=BLOCK_SIZE, max_concurrency=max_concurrency)
+        elapsed = time.perf_counter() - start
+        print(
+            f"upload_blocks x{max_concurrency:<2}        {PAYLOAD_SIZE / elapsed / 2**20:8.1f} MiB/s"
+        )
+
+    container.delete_container()
+
+
+if __name__ == "__main__":
+    main()
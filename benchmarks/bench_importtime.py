@@ -0,0 +1,75 @@
+"""Import time per module, measured with `python -X importtime` in fresh processes
+without any AZURE_* variables. Exits with 1 if a module takes longer than its
+budget or pulls in a heavy dependency it doesn't need at import time.
+
+    python benchmarks/bench_importtime.py
+"""
+import os
+import sys
+import subprocess
+
+RUNS = 5
+
+# module: (budget in ms, modules which must not be imported)
+BUDGETS = {
+    "azurify": (10, ["azurify.azconverter", "azurify.azstorage"]),
+    "azurify.azenv": (10, []),
+    "azurify.azcompress": (50, ["pandas", "azure"]),
+    "azurify.azconverter": (200, ["pandas", "pyarrow", "azure"]),
+    "azurify.azclients": (400, ["azure.identity", "azure.mgmt", "azure.storage"]),
+    "azurify.azsecrets": (600, ["pandas", "azure.mgmt", "azure.storage"]),
+    "azurify.azkeyvault": (600, ["pandas", "azure.mgmt", "azure.storage"]),
+    "azurify.azstorage": (1000, ["pandas", "azure.mgmt", "azure.identity"]),
+    "azurify.azpartition": (1000, ["pandas", "azure.mgmt", "azure.identity"]),
+}
+
+
+def import_time(module: str) -> tuple[float, set[str]]:
+    """Cumulative import time of `module` in ms and all modules it imported"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {key: value for key, value in os.environ.items() if not key.startswith("AZURE_")}
+    env["PYTHONPATH"] = root
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative, imported = 0, set()
+    # lines look like `import time:       123 |       4567 |   azurify.azenv`
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        name = name.strip()
+        if not total.strip().isdigit():
+            continue
+        imported.add(name)
+        if name == module:
+            cumulative = int(total)
+    return cumulative / 1000, imported
+
+
+def main():
+    failed = False
+    for module, (budget, forbidden) in BUDGETS.items():
+        timings = []
+        for _ in range(RUNS):
+            milliseconds, imported = import_time(module)
+            timings.append(milliseconds)
+        best = min(timings)
+        heavy = sorted(
+            name for name in imported if any(name == f or name.startswith(f"{f}.") for f in forbidden)
+        )
+        status = "ok"
+        if best > budget:
+            status, failed = f"over budget of {budget} ms", True
+        if heavy:
+            status, failed = f"imports {', '.join(heavy[:3])}", True
+        print(f"{module:<22} {best:7.1f} ms  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
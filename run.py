@@ -16,8 +16,9 @@ def main():
     print(f"my_data = {my_data}")
 
     my_converter = factory("csv")
-    my_converted_data = my_converter.convert(my_data).data
-    my_suffix = my_converter.convert(my_data).suffix
+    my_converted = my_converter.convert(my_data)
+    my_converted_data = my_converted.data
+    my_suffix = my_converted.suffix
     print(f"my_converter = {my_converter}")
     print(f"my converted data: {my_converted_data}")
     print(f"my converted data's filetype: {my_suffix}")
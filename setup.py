@@ -27,8 +27,16 @@ setup(
         "azure-mgmt-keyvault",
         "azure-mgmt-resource",
         "azure-storage-blob",
+        "cryptography",
     ],
-    extras_require={"dev": ["unitest", "twine"]},
+    extras_require={
+        "dev": ["unitest", "twine"],
+        "aio": ["aiohttp"],
+        "zstd": ["zstandard"],
+        "lz4": ["lz4"],
+        "parquet": ["pyarrow"],
+        "xlsx": ["xlsxwriter"],
+    },
     zip_safe=False,
     python_requires=">=3.9",
 )